@@ -0,0 +1,53 @@
+"""Compara la carga del grafo desde GeoJSON frente al formato compacto (map/compact.py).
+
+Mide el tiempo de carga y la memoria que ocupa cada representación del grafo
+de las ciudades incluidas en map/geojson.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_compact
+"""
+import os
+import time
+import tempfile
+import tracemalloc
+
+import osmnx as ox
+import geopandas as gpd
+
+from map.compact import geojson_to_compact, load_compact
+
+GEOJSON_DIR = "map/geojson"
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, memory
+
+
+def load_networkx(directory):
+    nodos = gpd.read_file(os.path.join(directory, "nodos.geojson")).set_index("osmid")
+    nodos["geometry"] = gpd.points_from_xy(nodos["x"], nodos["y"], crs=nodos.crs)
+    aristas = gpd.read_file(os.path.join(directory, "aristas.geojson")).set_index(["u", "v", "key"])
+    return ox.graph_from_gdfs(nodos, aristas)
+
+
+if __name__ == '__main__':
+    for city in sorted(os.listdir(GEOJSON_DIR)):
+        directory = os.path.join(GEOJSON_DIR, city)
+        with tempfile.TemporaryDirectory() as tmp:
+            geojson_to_compact(directory, tmp)
+            graph, t_geojson, m_geojson = measure(lambda: load_networkx(directory))
+            compact, t_mmap, m_mmap = measure(lambda: load_compact(tmp))
+            _, t_read, m_read = measure(lambda: load_compact(tmp, mmap=False))
+            size = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+            del compact
+
+        print(f"{city:32s} aristas={graph.number_of_edges():5d} "
+              f"geojson={t_geojson * 1000:7.1f}ms {m_geojson / 1e6:6.1f}MB  "
+              f"compacto(mmap)={t_mmap * 1000:5.2f}ms {m_mmap / 1e6:5.2f}MB  "
+              f"compacto(lectura)={t_read * 1000:5.2f}ms {m_read / 1e6:5.2f}MB  disco={size / 1e6:4.2f}MB")
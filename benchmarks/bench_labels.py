@@ -0,0 +1,70 @@
+"""Compara la colocación de etiquetas con rejilla frente al bucle cuadrático original.
+
+Usa las paradas de Majadahonda, replicadas con un pequeño desplazamiento para
+ver cómo crece cada método con el número de etiquetas.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_labels
+"""
+import time
+
+import numpy as np
+import geopandas as gpd
+import shapely
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+from map.labels import place_labels, data_to_points  # noqa: E402
+
+PARADAS = "map/geojson/Majadahonda, Spain/paradas.geojson"
+REPEATS = (1, 10, 30)
+
+
+def place_labels_quadratic(xy):
+    """Bucle original de create_map: compara cada etiqueta con todas las anteriores."""
+    text_positions = []
+    chosen = []
+    for x, y in xy:
+        dx, dy = 15, 10
+        for pos in text_positions:
+            if np.sqrt((x + dx - pos[0]) ** 2 + (y + dy - pos[1]) ** 2) < 0.2:
+                dx, dy = -dx, -dy
+        chosen.append((dx, dy))
+        text_positions.append((x + dx, y + dy))
+    return chosen
+
+
+def overlaps(points, offsets, min_distance):
+    """Pares de etiquetas a menos de ``min_distance`` puntos."""
+    labels = shapely.points(points + offsets)
+    left, right = shapely.STRtree(labels).query(labels, predicate="dwithin", distance=min_distance)
+    return int((left < right).sum())
+
+
+if __name__ == '__main__':
+    stops = gpd.read_file(PARADAS)
+    base = np.column_stack([stops.geometry.x, stops.geometry.y])
+    rng = np.random.default_rng(0)
+
+    fig, ax = plt.subplots(figsize=(30, 30))
+    left, bottom = base.min(axis=0)
+    right, top = base.max(axis=0)
+    ax.set_xlim(left, right)
+    ax.set_ylim(bottom, top)
+    ax.set_aspect(1 / np.cos(np.deg2rad((bottom + top) / 2)))
+
+    for repeat in REPEATS:
+        xy = np.vstack([base + rng.normal(0, 1e-3, base.shape) * (i > 0) for i in range(repeat)])
+        points = data_to_points(ax, xy)
+
+        start = time.perf_counter()
+        old = np.asarray(place_labels_quadratic(xy), dtype=float)
+        t_old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new = place_labels(points)
+        t_new = time.perf_counter() - start
+
+        print(f"etiquetas={len(xy):6d} original={t_old:8.3f}s rejilla={t_new:7.3f}s "
+              f"solapes original={overlaps(points, old, 12):6d} rejilla={overlaps(points, new, 12):6d}")
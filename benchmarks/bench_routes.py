@@ -0,0 +1,47 @@
+"""Compara la extracción de paradas con BeautifulSoup frente al lector por streaming.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_routes
+"""
+import glob
+import time
+
+from bs4 import BeautifulSoup
+
+from routes import routes as route
+
+INPUTS = "routes/input/*.json"
+REPEAT = 50  # se repite cada fichero para que los tiempos sean medibles
+
+
+def procesar_paradas_bs4(stop_contents):
+    """Implementación original de procesar_paradas, usada como referencia."""
+    stops_dict = {}
+    codigos_list = []
+    for i, content in enumerate(stop_contents):
+        soup = BeautifulSoup(content, 'html.parser')
+        stop_name = soup.find('div', class_=route.STOP_NAME_CLASS)
+        stop_code = soup.find('div', class_=route.STOP_CODE_CLASS)
+        info_parada = {
+            "stopName": stop_name.text.strip() if stop_name else None,
+            "stopCodeSection": stop_code.text.strip().replace('#', '') if stop_code else None
+        }
+        if info_parada["stopName"] and info_parada["stopCodeSection"]:
+            stops_dict[f"Parada {i + 1}"] = info_parada
+            codigos_list.append(info_parada["stopCodeSection"])
+    return stops_dict, codigos_list
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = fn(*args)
+    return result, (time.perf_counter() - start) / REPEAT
+
+
+if __name__ == '__main__':
+    for path in sorted(glob.glob(INPUTS)):
+        old, t_old = timed(lambda: procesar_paradas_bs4(route.read_json(path)))
+        new, t_new = timed(lambda: route.procesar_paradas(route.iter_json_array(path)))
+        print(f"{path:32s} paradas={len(new[1]):3d} bs4={t_old * 1000:7.2f}ms "
+              f"streaming={t_new * 1000:6.2f}ms x{t_old / t_new:5.1f} iguales={old == new}")
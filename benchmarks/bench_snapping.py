@@ -0,0 +1,57 @@
+"""Compara el snapping de paradas con STRtree frente al método original.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_snapping
+"""
+import os
+import time
+
+import numpy as np
+import osmnx as ox
+import shapely
+
+from map import map as mapa
+from map.snapping import snap_bus_stops, snap_bus_stops_brute_force
+
+GEOJSON_DIR = "map/geojson"
+
+
+def jitter(bus_stops, scale=2e-4, seed=0):
+    """Desplaza las paradas para que no caigan justo sobre la red (ya están proyectadas)."""
+    rng = np.random.default_rng(seed)
+    moved = bus_stops.copy()
+    offsets = rng.normal(0, scale, size=(len(moved), 2))
+    moved["geometry"] = shapely.transform(moved.geometry.values, lambda c: c + offsets)
+    return moved
+
+
+def same_result(a, b):
+    for x, y in zip(a, b):
+        if (x is None) != (y is None):
+            return False
+        if x is not None and (x[0] != y[0] or not x[1].equals_exact(y[1], 0)):
+            return False
+    return len(a) == len(b)
+
+
+def run(city):
+    graph, _, bus_stops = mapa.load_geojson(os.path.join(GEOJSON_DIR, city))
+    _, edges = ox.graph_to_gdfs(graph)
+    bus_stops = jitter(bus_stops)
+
+    start = time.perf_counter()
+    fast = snap_bus_stops(edges, bus_stops)
+    t_fast = time.perf_counter() - start
+
+    start = time.perf_counter()
+    slow = snap_bus_stops_brute_force(edges, bus_stops)
+    t_slow = time.perf_counter() - start
+
+    print(f"{city:35s} paradas={len(bus_stops):4d} aristas={len(edges):5d} "
+          f"original={t_slow:8.3f}s strtree={t_fast:7.3f}s x{t_slow / t_fast:6.1f} "
+          f"iguales={same_result(fast, slow)}")
+
+
+if __name__ == '__main__':
+    for name in sorted(os.listdir(GEOJSON_DIR)):
+        run(name)
@@ -0,0 +1,65 @@
+"""Mide el tiempo de arranque de los puntos de entrada y qué librerías pesadas cargan.
+
+Cada caso se ejecuta en un intérprete nuevo. El caso "ruta" procesa una ruta
+completa con ``jobs.run_route_job`` (la salida se escribe en un directorio
+temporal) y comprueba que no se ha cargado ninguna de HEAVY_MODULES; si alguna
+se carga, el script termina con código 1.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_startup
+"""
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+import tempfile
+
+HEAVY_MODULES = ("osmnx", "geopandas", "shapely", "matplotlib", "pandas", "networkx", "bs4")
+REPEAT = 5
+
+CASES = {
+    "python": "pass",
+    "import routes.routes": "import routes.routes",
+    "import jobs": "import jobs",
+    "import cli": "import cli",
+    "import main": "import main",
+    "ruta": "import jobs; jobs.run_route_job('L1.json', os.path.join({tmp!r}, 'L1.json'))",
+    "import map.map": "import map.map",
+}
+
+SCRIPT = """
+import os, sys, json, time, contextlib, io
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    {code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+def run_case(code):
+    """Ejecuta ``code`` en intérpretes nuevos: mediana del proceso, tiempo del código y librerías pesadas cargadas."""
+    script = SCRIPT.format(code=code, heavy=HEAVY_MODULES)
+    env = dict(os.environ, MPLBACKEND="Agg", PYTHONDONTWRITEBYTECODE="1")
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True, env=env)
+        times.append(time.perf_counter() - start)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+    return statistics.median(times), result["seconds"], result["heavy"]
+
+
+if __name__ == '__main__':
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, code in CASES.items():
+            total, imports, heavy = run_case(code.format(tmp=tmp))
+            print(f"{name:22s} proceso={total * 1000:7.1f}ms código={imports * 1000:7.1f}ms "
+                  f"pesadas={', '.join(heavy) or '-'}")
+            if name == "ruta" and heavy:
+                failed = True
+                print(f"[ERROR] Procesar una ruta carga {', '.join(heavy)}.")
+    sys.exit(1 if failed else 0)
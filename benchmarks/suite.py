@@ -0,0 +1,191 @@
+"""Mide las etapas del mapa y de las rutas sobre los datos incluidos y compara con una referencia.
+
+Etapas: integración de paradas en el grafo (``integrate_bus_stops_into_graph``),
+colocación de etiquetas, ``export_geojson`` y ``procesar_paradas``. Todo se
+ejecuta sin conexión con los datos de map/geojson y routes/input. Para cada
+etapa se guarda el tiempo (el mejor de ``--repeat`` ejecuciones), el pico de
+memoria (medido aparte con tracemalloc) y los contadores de operaciones.
+La referencia depende de la máquina: hay que regenerarla al cambiar de equipo.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.suite                      # compara con benchmarks/baseline.json
+    python -m benchmarks.suite --update-baseline    # guarda los resultados como referencia
+    python -m benchmarks.suite --city "Majadahonda, Spain" --repeat 5
+"""
+import gc
+import io
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import contextlib
+import platform
+import tempfile
+import tracemalloc
+
+import numpy as np
+import osmnx as ox
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+from benchmarks.bench_snapping import jitter  # noqa: E402
+from map import map as mapa  # noqa: E402
+from map.labels import place_labels, data_to_points  # noqa: E402
+from routes import routes as route  # noqa: E402
+
+GEOJSON_DIR = "map/geojson"
+ROUTES_INPUTS = "routes/input/*.json"
+BASELINE = "benchmarks/baseline.json"
+RESULTS = "benchmarks/results.json"
+TOLERANCE = 0.5  # aumento relativo permitido frente a la referencia (los tiempos tienen ruido)
+MIN_SECONDS = 0.005  # por debajo de esto las diferencias de tiempo son ruido
+MIN_BYTES = 256 * 1024  # y por debajo de esto las de memoria
+
+
+def measure(fn, repeat):
+    """Ejecuta ``fn`` ``repeat`` veces y una más con tracemalloc.
+
+    ``fn`` devuelve un diccionario de contadores. Devuelve el menor de los
+    tiempos (el menos afectado por el resto del sistema), el pico de memoria y
+    los contadores de la última ejecución. Los mensajes de las etapas se descartan.
+    """
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Como timeit: sin recolector de basura durante las mediciones de tiempo
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                counts = fn()
+                times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {"seconds": min(times), "peak_bytes": peak, "counts": counts}
+
+
+def city_stages(city):
+    """Etapas del mapa de una ciudad: ``{nombre: función}``."""
+    directory = os.path.join(GEOJSON_DIR, city)
+    graph, buildings, bus_stops = mapa.load_geojson(directory)
+    # Las paradas exportadas ya están sobre la red: se desplazan para que haya que proyectarlas
+    stops = jitter(bus_stops)
+
+    def snapping():
+        new_graph, new_stops = mapa.integrate_bus_stops_into_graph(graph, stops)
+        return {"paradas": len(stops), "paradas_integradas": int(new_stops["node_id"].notna().sum()),
+                "nodos_nuevos": len(new_graph) - len(graph),
+                "aristas_nuevas": new_graph.number_of_edges() - graph.number_of_edges()}
+
+    # Misma figura que el preset "completo" de render_map
+    fig, ax = plt.subplots(figsize=(30, 30))
+    xy = np.column_stack([bus_stops.geometry.x, bus_stops.geometry.y])
+    left, bottom, right, top = ox.graph_to_gdfs(graph, nodes=False).total_bounds
+    ax.set_xlim(left, right)
+    ax.set_ylim(bottom, top)
+    ax.set_aspect(1 / np.cos(np.deg2rad((bottom + top) / 2)))
+    points = data_to_points(ax, xy)
+    plt.close(fig)
+
+    def labels():
+        offsets = place_labels(points)
+        return {"etiquetas": len(offsets), "desplazadas": int((offsets != offsets[0:1]).any(axis=1).sum())}
+
+    def export():
+        with tempfile.TemporaryDirectory() as tmp:
+            mapa.export_geojson(tmp, graph, buildings, bus_stops)
+            files = glob.glob(os.path.join(tmp, "*.geojson"))
+            return {"capas": len(files), "entidades": len(graph) + graph.number_of_edges() + len(buildings)
+                    + len(bus_stops), "bytes": sum(os.path.getsize(path) for path in files)}
+
+    return {"snapping": snapping, "etiquetas": labels, "export_geojson": export}
+
+
+def route_stages():
+    """Etapas de rutas: ``procesar_paradas`` de cada fichero de routes/input."""
+    def stage(path):
+        def procesar():
+            stops_dict, _ = route.procesar_paradas(route.iter_json_array(path))
+            return {"paradas": len(stops_dict)}
+        return procesar
+
+    return {"procesar_paradas/" + os.path.basename(path): stage(path) for path in sorted(glob.glob(ROUTES_INPUTS))}
+
+
+def run(cities, repeat, with_routes=True):
+    results = {}
+    for city in cities:
+        for stage, fn in city_stages(city).items():
+            results[f"{city}/{stage}"] = measure(fn, repeat)
+            print(f"[INFO] {city}/{stage}: {results[f'{city}/{stage}']['seconds'] * 1000:.1f} ms")
+    if with_routes:
+        for stage, fn in route_stages().items():
+            results[stage] = measure(fn, repeat)
+            print(f"[INFO] {stage}: {results[stage]['seconds'] * 1000:.1f} ms")
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Compara con la referencia y devuelve la lista de regresiones (texto)."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric, minimum in (("seconds", MIN_SECONDS), ("peak_bytes", MIN_BYTES)):
+            new, old = result[metric], reference[metric]
+            if new > old * (1 + tolerance) and new - old > minimum:
+                regressions.append(f"{name}: {metric} {old:.4g} -> {new:.4g} (x{new / old:.2f})")
+        if result["counts"] != reference["counts"]:
+            regressions.append(f"{name}: contadores {reference['counts']} -> {result['counts']}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de las etapas del mapa y de las rutas.")
+    parser.add_argument("--city", action="append", help="Ciudad de map/geojson a medir (por defecto, todas).")
+    parser.add_argument("--repeat", type=int, default=5, help="Ejecuciones por etapa (se guarda la más rápida).")
+    parser.add_argument("--output", default=RESULTS, help="Fichero JSON donde guardar los resultados.")
+    parser.add_argument("--baseline", default=BASELINE, help="Resultados de referencia con los que comparar.")
+    parser.add_argument("--update-baseline", action="store_true", help="Guardar los resultados como referencia.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Aumento relativo de tiempo o memoria que se considera regresión.")
+    parser.add_argument("--no-routes", action="store_true", help="No medir las etapas de rutas.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cities = args.city or sorted(os.listdir(GEOJSON_DIR))
+    results = run(cities, args.repeat, with_routes=not args.no_routes)
+
+    report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    path = args.baseline if args.update_baseline else args.output
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"[INFO] Resultados guardados en {path}.")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"[REGRESIÓN] {regression}")
+    if not regressions:
+        print("[INFO] Sin regresiones frente a la referencia.")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Generación de mapas y rutas sin interfaz gráfica.
+
+Ejemplos (desde la raíz del repositorio):
+    python cli.py --city "Majadahonda, Spain" --city "Colmenarejo, Spain" --geojson
+    python cli.py --route 652_vuelta.json:652B.json --route L1.json --workers 2
+    python cli.py --routes-dir routes/input --paths "Majadahonda, Spain"
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+# Sin pantalla: matplotlib debe usar un backend no interactivo en todos los procesos
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import instrumentation  # noqa: E402
+import jobs  # noqa: E402
+from map.presets import RENDER_PRESETS  # noqa: E402
+from routes import routes as route  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Genera mapas GeoJson y rutas de autobús sin interfaz gráfica.")
+    parser.add_argument("--city", action="append", default=[],
+                        help="Ciudad de la que generar el mapa (se puede repetir).")
+    parser.add_argument("--route", action="append", default=[], metavar="INPUT[:OUTPUT]",
+                        help="Fichero de routes/input a procesar y, opcionalmente, su nombre en routes/output "
+                             "(por defecto, 'X_ida.json' -> 'XA.json' y 'X_vuelta.json' -> 'XB.json').")
+    parser.add_argument("--routes-dir", metavar="DIR_O_GLOB",
+                        help="Procesar todas las rutas de un directorio (o patrón) y generar routes/index.json.")
+    parser.add_argument("--check", action="append", default=[], metavar="CITY",
+                        help="Validar las rutas de routes/output contra las paradas de esta ciudad al terminar.")
+    parser.add_argument("--paths", action="append", default=[], metavar="CITY",
+                        help="Calcular el recorrido de cada línea de routes/index.json sobre el grafo de esta ciudad.")
+    parser.add_argument("--image", action="store_true", help="Exportar el mapa como imagen.")
+    parser.add_argument("--geojson", action="store_true", help="Exportar el mapa como GeoJson.")
+    parser.add_argument("--preset", default="completo", choices=sorted(RENDER_PRESETS),
+                        help="Tamaño y resolución de la imagen del mapa.")
+    parser.add_argument("--tiles", type=int, nargs=2, metavar=("ZMIN", "ZMAX"),
+                        help="Exportar teselas XYZ en ese rango de zooms en lugar de una única imagen.")
+    parser.add_argument("--prune", action="store_true",
+                        help="Podar el grafo antes de exportarlo (mayor componente conexa y nodos de grado 2).")
+    parser.add_argument("--route-distance", type=float, metavar="METROS",
+                        help="Con --prune, conservar solo las calles a menos de esa distancia de rutas.geojson.")
+    parser.add_argument("--precision", type=int, metavar="DECIMALES",
+                        help="Redondear las coordenadas del GeoJson a ese número de decimales.")
+    parser.add_argument("--compact", action="store_true", help="Escribir el GeoJson sin saltos de línea.")
+    parser.add_argument("--siblings", nargs="+", default=[], choices=("fgb", "parquet"), metavar="FORMATO",
+                        help="Guardar además cada capa en estos formatos (fgb, parquet) para recargarla más rápido.")
+    parser.add_argument("--chunk-size", type=float, metavar="METROS",
+                        help="Generar el GeoJson por teselas de ese lado (para áreas metropolitanas grandes); "
+                             "solo con --geojson y siempre se regenera.")
+    parser.add_argument("--offline", action="store_true", help="Usar solo los datos de OSM en caché.")
+    parser.add_argument("--force", action="store_true",
+                        help="Regenerar todas las salidas aunque sus entradas no hayan cambiado.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Número máximo de trabajos simultáneos (por defecto, uno por CPU).")
+    parser.add_argument("--trace", metavar="FICHERO.jsonl",
+                        help="Guardar la duración y los contadores de cada etapa en este fichero JSON lines.")
+    parser.add_argument("--log-stages", action="store_true", help="Mostrar la duración de cada etapa con logging.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Con --trace o --log-stages, incluir el perfil de cProfile de cada trabajo.")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Con --trace o --log-stages, incluir el pico de memoria de cada trabajo.")
+    parser.add_argument("--summary", help="Guardar el resumen de los trabajos en este fichero JSON.")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size and args.city:
+        try:
+            jobs.check_tiled_options(args.image, args.geojson, tiles=args.tiles, prune=args.prune,
+                                     route_distance=args.route_distance, precision=args.precision,
+                                     compact=args.compact, siblings=args.siblings)
+        except ValueError as e:
+            parser.error(f"--chunk-size: {e} Usa --geojson sin --image, --tiles, --prune, --route-distance, "
+                         f"--precision, --compact ni --siblings.")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.log_stages:
+        logging.basicConfig(level=logging.INFO, format="[%(name)s] %(message)s")
+    instrumentation.configure(**instrumentation_options(args))
+
+    if not args.city and not args.route and not args.routes_dir and not args.check and not args.paths:
+        print("[ERROR] Indica al menos una ciudad (--city), una ruta (--route, --routes-dir), --check o --paths.")
+        return 2
+
+    if args.routes_dir:
+        route.create_routes(args.routes_dir, workers=args.workers, force=args.force)
+
+    summaries = []
+    if args.city or args.route:
+        summaries = run(args)
+
+    for city in args.check:
+        route.check_route(city)
+
+    if args.paths:
+        from map import map as mapa
+        from map.routing import create_route_paths
+    for city in args.paths:
+        graph, _, _ = mapa.load_geojson(os.path.join("map/geojson", city))
+        create_route_paths(city, graph)
+
+    return 1 if any(summary["error"] for summary in summaries) else 0
+
+
+def run(args):
+    """Ejecuta los trabajos de mapa y ruta pedidos y devuelve sus resúmenes."""
+    map_jobs = [(city, args.image, args.geojson, args.offline, args.force, args.preset, args.tiles,
+                 args.prune, args.route_distance, args.chunk_size, args.precision, args.compact, args.siblings)
+                for city in args.city]
+    route_jobs = []
+    for spec in args.route:
+        input_json, _, output_json = spec.partition(":")
+        # Sin salida se usa el mismo nombre que con --routes-dir ('651_ida.json' -> '651A.json')
+        route_jobs.append((input_json, output_json or route.output_name(input_json)))
+
+    summaries = jobs.run_jobs(map_jobs, route_jobs, workers=args.workers,
+                              instrumentation_options=instrumentation_options(args))
+    jobs.print_summary(summaries)
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=4)
+
+    return summaries
+
+
+def instrumentation_options(args):
+    """Argumentos de ``instrumentation.configure`` según las opciones de la línea de comandos."""
+    return {"trace": args.trace, "log": args.log_stages, "profile": args.profile, "memory": args.trace_memory}
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Medición de las etapas de create_map y create_route.
+
+Las etapas se marcan con ``span(nombre)`` o con el decorador ``traced`` y
+dentro de ellas se acumulan contadores con ``count(nombre, n)``. Al cerrar cada
+etapa se envía un evento (tiempo, contadores y, si se pidió, pico de memoria y
+perfil de cProfile) a los destinos activados con ``enable``. Sin destinos
+activos ``span`` devuelve un contexto vacío compartido y ``count`` no hace
+nada, así que el coste es una comprobación por llamada.
+
+Ejemplo:
+    import instrumentation
+    instrumentation.enable(instrumentation.JsonLinesSink("traza.jsonl"), profile=True)
+"""
+import io
+import json
+import functools
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime, timezone
+
+PROFILE_TOP = 20  # funciones del perfil que se guardan en cada evento
+
+_sinks = []
+_options = {"profile": False, "memory": False}
+_local = threading.local()  # pila de etapas abiertas en cada hilo
+
+
+class LoggingSink:
+    """Envía cada evento como una línea del módulo logging."""
+
+    def __init__(self, logger="instrumentation", level=logging.INFO):
+        self.logger = logging.getLogger(logger) if isinstance(logger, str) else logger
+        self.level = level
+
+    def __call__(self, event):
+        counters = " ".join(f"{name}={value}" for name, value in event["counters"].items())
+        self.logger.log(self.level, "%s %.3f s %s", event["span"], event["seconds"], counters)
+
+
+class JsonLinesSink:
+    """Añade cada evento como una línea JSON al final de ``path``.
+
+    El fichero se abre en cada evento, así que varios procesos (p. ej. los de
+    ``jobs.run_jobs``) pueden escribir en el mismo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def enable(*sinks, profile=False, memory=False):
+    """Activa la medición con los destinos indicados.
+
+    Con ``profile`` cada etapa de primer nivel se ejecuta con cProfile y con
+    ``memory`` se registra su pico de memoria con tracemalloc (ambos ralentizan).
+    """
+    _sinks[:] = sinks
+    _options.update(profile=profile, memory=memory)
+
+
+def configure(trace=None, log=False, profile=False, memory=False):
+    """Activa la medición a partir de opciones simples (p. ej. las de cli.py).
+
+    ``trace`` es un fichero JSON lines y ``log`` envía además los eventos a
+    logging. Sin ningún destino la medición queda desactivada. Al recibir solo
+    valores simples sirve como ``initializer`` de un pool de procesos.
+    """
+    sinks = []
+    if trace:
+        sinks.append(JsonLinesSink(trace))
+    if log:
+        sinks.append(LoggingSink())
+    if sinks:
+        enable(*sinks, profile=profile, memory=memory)
+    else:
+        disable()
+
+
+def disable():
+    """Desactiva la medición."""
+    _sinks.clear()
+    _options.update(profile=False, memory=False)
+
+
+def enabled():
+    return bool(_sinks)
+
+
+def span(name, **fields):
+    """Contexto que mide una etapa; ``fields`` se añaden tal cual al evento."""
+    if not _sinks:
+        return _NULL_SPAN
+    return _Span(name, fields)
+
+
+def traced(name):
+    """Decorador que mide cada llamada a la función como la etapa ``name``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return fn(*args, **kwargs)
+            with _Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """Suma ``n`` al contador ``name`` de la etapa abierta más interna."""
+    if not _sinks:
+        return
+    stack = getattr(_local, "stack", None)
+    if stack:
+        counters = stack[-1].counters
+        counters[name] = counters.get(name, 0) + n
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.counters = {}
+        self._profiler = None
+        self._tracing = False
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        self.parent = stack[-1].name if stack else None
+        top_level = not stack
+        stack.append(self)
+
+        # cProfile y tracemalloc no se pueden anidar: solo en las etapas de primer nivel
+        if top_level and _options["memory"]:
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        if top_level and _options["profile"]:
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:  # ya hay otro perfilador activo (p. ej. en otro hilo)
+                self._profiler = None
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+        _local.stack.pop()
+
+        event = {"span": self.name, "parent": self.parent, "seconds": seconds, "counters": self.counters,
+                 "time": datetime.now(timezone.utc).isoformat(), "error": exc_type.__name__ if exc_type else None,
+                 **self.fields}
+        if _options["memory"] and self.parent is None:
+            event["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            if self._tracing:
+                tracemalloc.stop()
+        if self._profiler is not None:
+            event["profile"] = _profile_summary(self._profiler)
+
+        for sink in _sinks:
+            sink(event)
+        return False
+
+
+def _profile_summary(profiler):
+    """Las PROFILE_TOP funciones con más tiempo acumulado."""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+    return [{"function": f"{filename}:{line}({function})", "calls": calls, "tottime": tottime, "cumtime": cumtime}
+            for (filename, line, function), (_, calls, tottime, cumtime, _) in rows]
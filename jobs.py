@@ -0,0 +1,120 @@
+"""Trabajos de generación de mapas y rutas compartidos por la interfaz y la CLI."""
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import instrumentation
+from routes import routes as route
+
+
+class JobCancelled(Exception):
+    """Se lanza desde la función de progreso para detener un trabajo en curso."""
+
+
+def run_map_job(city, flag_image, flag_geojson, offline=False, force=False, preset="completo", tiles=None,
+                prune=False, route_distance=None, chunk_size=None, precision=None, compact=False, siblings=(),
+                progress=None):
+    """Genera el mapa de una ciudad y devuelve el resumen del trabajo.
+
+    ``precision``, ``compact`` y ``siblings`` son las opciones de formato del GeoJson (ver ``create_map``).
+
+    Con ``chunk_size`` (metros) el mapa se genera por teselas con ``map.tiled.create_map_tiled``,
+    que solo escribe el GeoJson (ver ``check_tiled_options``) y siempre lo regenera.
+    """
+    def job():
+        # OSMnx, GeoPandas y matplotlib solo se cargan cuando hay que generar un mapa
+        from map import map as mapa
+        from map.cache import OSMCache
+
+        if chunk_size:
+            check_tiled_options(flag_image, flag_geojson, tiles=tiles, prune=prune, route_distance=route_distance,
+                                precision=precision, compact=compact, siblings=siblings)
+            from map.tiled import create_map_tiled
+            summary = create_map_tiled(city, tile_size=chunk_size, cache_options={"offline": offline},
+                                       progress=progress)
+            return {"nodes": summary["nodes"], "edges": summary["edges"], "stops": summary["stops"]}
+
+        graph, _, bus_stops = mapa.create_map(city, flag_image, flag_geojson, cache=OSMCache(offline=offline),
+                                              progress=progress, force=force, preset=preset, tiles=tiles,
+                                              prune=prune, route_distance=route_distance, precision=precision,
+                                              compact=compact, siblings=siblings)
+        return {"nodes": len(graph), "edges": graph.number_of_edges(), "stops": len(bus_stops)}
+
+    return _run("mapa", city, job)
+
+
+def check_tiled_options(flag_image, flag_geojson, tiles=None, prune=False, route_distance=None, precision=None,
+                        compact=False, siblings=()):
+    """Comprueba que un mapa se puede generar por teselas; si no, lanza ``ValueError``.
+
+    El modo por teselas solo escribe el GeoJson, con el formato por defecto: no genera
+    imagen ni teselas XYZ, no poda el grafo y no admite las opciones de formato.
+    """
+    unsupported = [name for name, value in (("imagen", flag_image), ("teselas XYZ", tiles), ("poda", prune),
+                                            ("distancia a las rutas", route_distance is not None),
+                                            ("precisión", precision is not None), ("GeoJson compacto", compact),
+                                            ("formatos adicionales", siblings)) if value]
+    if unsupported:
+        raise ValueError(f"El modo por teselas solo genera GeoJson; no admite: {', '.join(unsupported)}.")
+    if not flag_geojson:
+        raise ValueError("El modo por teselas solo genera GeoJson y no se ha pedido.")
+
+
+def run_route_job(input_json, output_json, progress=None):
+    """Procesa un fichero de ruta y devuelve el resumen del trabajo."""
+    def job():
+        _, stops_id_list = route.create_route(input_json, output_json, progress=progress)
+        return {"stops": len(stops_id_list)}
+
+    return _run("ruta", input_json, job)
+
+
+def run_jobs(map_jobs=(), route_jobs=(), workers=None, instrumentation_options=None):
+    """Ejecuta los trabajos en un pool de procesos con como mucho ``workers`` a la vez.
+
+    ``map_jobs`` son tuplas de argumentos de ``run_map_job`` y ``route_jobs`` de
+    ``run_route_job``. ``instrumentation_options`` son los argumentos de
+    ``instrumentation.configure`` con los que se activa la medición en cada proceso.
+    Devuelve los resúmenes en el orden en que se pidieron.
+    """
+    tasks = [(run_map_job, args) for args in map_jobs] + [(run_route_job, args) for args in route_jobs]
+    summaries = [None] * len(tasks)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(instrumentation_options or {},)) as pool:
+        futures = {pool.submit(fn, *args): i for i, (fn, args) in enumerate(tasks)}
+        for future in as_completed(futures):
+            summaries[futures[future]] = future.result()
+
+    return summaries
+
+
+def print_summary(summaries):
+    """Imprime una tabla con el resultado de cada trabajo."""
+    print(f"{'Trabajo':6s} {'Objetivo':35s} {'Tiempo':>9s} {'Nodos':>7s} {'Aristas':>8s} {'Paradas':>8s}  Estado")
+    for summary in summaries:
+        print(f"{summary['job']:6s} {summary['target']:35s} {summary['seconds']:8.2f}s "
+              f"{_count(summary, 'nodes'):>7s} {_count(summary, 'edges'):>8s} {_count(summary, 'stops'):>8s}  "
+              f"{'OK' if summary['error'] is None else 'ERROR: ' + summary['error']}")
+
+
+def _run(job, target, fn):
+    summary = {"job": job, "target": target, "error": None}
+    start = time.perf_counter()
+    try:
+        summary.update(fn())
+    except JobCancelled:
+        summary["error"] = "Cancelado"
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+        summary["traceback"] = traceback.format_exc()
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def _init_worker(instrumentation_options):
+    instrumentation.configure(**instrumentation_options)
+
+
+def _count(summary, name):
+    return str(summary[name]) if name in summary else "-"
@@ -1,10 +1,15 @@
+import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+# Los mapas se dibujan en un hilo de fondo: matplotlib no puede usar Tk desde él
+os.environ.setdefault("MPLBACKEND", "Agg")
+
 from PIL.Image import Resampling
 
-from map import map as mapa
-from routes import routes as route
+import jobs
 from PIL import Image, ImageTk
 
 BG_COLOR       = "#F5F5F7"   # fondo general
@@ -12,6 +17,19 @@ ENTRY_BG_COLOR = "#FFFFFF"   # fondo de los Entry
 FG_COLOR       = "#1C1C1E"   # texto oscuro
 ACCENT_COLOR   = "#007AFF"   # azul
 ACCENT_ACTIVE  = "#005BBB"   # azul al pulsar
+CANCEL_COLOR   = "#8E8E93"   # gris del botón cancelar
+CANCEL_ACTIVE  = "#636366"   # gris al pulsar
+POLL_MS        = 100         # cada cuánto se leen los eventos del hilo de trabajo
+
+# Parte de la barra de progreso que corresponde a cada etapa
+STAGE_PROGRESS = {
+    "descarga":    (0, 25),
+    "snapping":    (25, 60),
+    "poda":        (60, 60),
+    "renderizado": (60, 85),
+    "procesado":   (0, 85),
+    "exportación": (85, 100),
+}
 
 class MapRouteApp:
     def __init__(self, root):
@@ -31,9 +49,18 @@ class MapRouteApp:
         self.show_map       = tk.BooleanVar()
         self.save_map       = tk.BooleanVar()
 
+        # Trabajos pendientes y eventos del hilo de trabajo hacia la interfaz
+        self.pending_jobs = queue.Queue()
+        self.events       = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.queued       = 0
+
         self._setup_style()
         self._build_ui()
 
+        threading.Thread(target=self._worker, daemon=True).start()
+        self.root.after(POLL_MS, self._poll_events)
+
     def _setup_style(self):
         style = ttk.Style(self.root)
 
@@ -92,6 +119,24 @@ class MapRouteApp:
         self.execute_btn.bind("<Enter>", lambda e: self.execute_btn.config(bg=ACCENT_ACTIVE))
         self.execute_btn.bind("<Leave>", lambda e: self.execute_btn.config(bg=ACCENT_COLOR))
 
+        # Progreso del trabajo en curso
+        self.status_label = ttk.Label(container, text="Sin trabajos en curso", font=("Helvetica Neue", 12))
+        self.status_label.pack(anchor="w", pady=(10, 2))
+        self.progress_bar = ttk.Progressbar(container, orient="horizontal", mode="determinate", maximum=100)
+        self.progress_bar.pack(fill="x")
+
+        # Botón Cancelar
+        self.cancel_btn = tk.Label(container, text="Cancelar",
+                                   font=("Helvetica Neue", 12, "bold"),
+                                   fg="white", bg=CANCEL_COLOR,
+                                   padx=5, pady=3)
+
+        self.cancel_btn.pack(fill="x", pady=(10, 0))
+
+        self.cancel_btn.bind("<Button-1>", lambda e: self.cancel_event.set())
+        self.cancel_btn.bind("<Enter>", lambda e: self.cancel_btn.config(bg=CANCEL_ACTIVE))
+        self.cancel_btn.bind("<Leave>", lambda e: self.cancel_btn.config(bg=CANCEL_COLOR))
+
     def _make_section(self, parent, name, var, build_fn):
         section = ttk.Frame(parent)
         section.pack(fill="x", pady=10)
@@ -146,17 +191,82 @@ class MapRouteApp:
         frame.columnconfigure(1, weight=1)
 
     def execute_operations(self):
+        """Encola un trabajo con las opciones actuales; se ejecuta en segundo plano."""
+        job = {
+            "map":   (self.location_entry.get(), self.show_map.get(), self.save_map.get())
+                     if self.generate_map.get() else None,
+            "route": (self.route1_entry.get(), self.route2_entry.get())
+                     if self.generate_route.get() else None,
+        }
+        self.queued += 1
+        self.pending_jobs.put(job)
+        self._update_status()
+
+    def _worker(self):
+        """Hilo de fondo: ejecuta los trabajos en orden y publica su progreso."""
+        while True:
+            job = self.pending_jobs.get()
+            self.cancel_event.clear()
+            self.events.put(("start", job))
+
+            summaries = []
+            if job["map"]:
+                summaries.append(jobs.run_map_job(*job["map"], progress=self._progress))
+            if job["route"] and self.cancel_event.is_set():
+                # Cancelado durante el mapa: la ruta ni se empieza
+                summaries.append({"job": "ruta", "target": job["route"][0], "error": "Cancelado", "seconds": 0.0})
+            elif job["route"]:
+                summaries.append(jobs.run_route_job(*job["route"], progress=self._progress))
+
+            self.events.put(("done", summaries))
+
+    def _progress(self, stage, done, total):
+        """Función de progreso de los trabajos; se ejecuta en el hilo de fondo."""
+        if self.cancel_event.is_set():
+            raise jobs.JobCancelled()
+        self.events.put(("progress", (stage, done, total)))
+
+    def _poll_events(self):
+        """Aplica en la interfaz los eventos publicados por el hilo de trabajo."""
         try:
-            if self.generate_map.get():
-                mapa.create_map(self.location_entry.get(),
-                                self.show_map.get(),
-                                self.save_map.get())
-            if self.generate_route.get():
-                route.create_route(self.route1_entry.get(),
-                                   self.route2_entry.get())
+            while True:
+                kind, data = self.events.get_nowait()
+                if kind == "start":
+                    self.queued -= 1
+                    self.progress_bar["value"] = 0
+                    self._update_status("Iniciando")
+                elif kind == "progress":
+                    self._show_progress(*data)
+                elif kind == "done":
+                    self._show_result(data)
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self._poll_events)
+
+    def _show_progress(self, stage, done, total):
+        start, end = STAGE_PROGRESS.get(stage, (0, 100))
+        fraction = done / total if total else 0
+        self.progress_bar["value"] = start + (end - start) * fraction
+        text = stage.capitalize() + (f" {done}/{total}" if total else "")
+        self._update_status(text)
+
+    def _show_result(self, summaries):
+        self.progress_bar["value"] = 100
+        self._update_status("Sin trabajos en curso" if not self.queued else "Siguiente trabajo")
+
+        errors = [summary["error"] for summary in summaries if summary["error"]]
+        if "Cancelado" in errors:
+            messagebox.showinfo("Cancelado", "El trabajo se ha cancelado")
+        elif errors:
+            messagebox.showerror("Error", f"Ocurrió un error: {errors[0]}")
+        else:
             messagebox.showinfo("Éxito", "Operaciones completadas correctamente")
-        except Exception as e:
-            messagebox.showerror("Error", f"Ocurrió un error: {e}")
+
+    def _update_status(self, text=None):
+        text = text or self.status_label.cget("text").split(" (")[0]
+        if self.queued:
+            text += f" ({self.queued} en cola)"
+        self.status_label.config(text=text)
 
 if __name__ == '__main__':
     root = tk.Tk()
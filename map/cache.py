@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import osmnx as ox
+import networkx as nx
+import geopandas as gpd
+import shapely
+from osmnx._errors import InsufficientResponseError
+
+from map.export import encode_list_columns, decode_list_columns
+
+CACHE_DIR = os.path.join("map", "cache")
+CACHE_TTL = 7 * 24 * 3600            # segundos que una descarga se considera vigente
+CACHE_MAX_BYTES = 2 * 1024 ** 3      # tamaño máximo del directorio de caché
+WGS84 = "EPSG:4326"
+
+
+class OSMCache:
+    """Caché local de las descargas de OSM, direccionada por contenido.
+
+    Cada consulta se identifica por un hash de su tipo, lugar, tipo de red y
+    etiquetas. Los grafos se guardan en GraphML y las entidades en GeoParquet,
+    junto a un ``.json`` con los metadatos de la entrada.
+
+    El límite del lugar se geocodifica una sola vez (y solo si alguna capa no
+    está en caché) y se comparte entre la red y las entidades. ``fetch_boundary``,
+    ``fetch_graph`` y ``fetch_features`` permiten sustituir las descargas de
+    OSMnx por una fuente local; las dos últimas reciben el polígono. En modo ``offline`` nunca se accede a la red:
+    se usan las entradas guardadas aunque hayan caducado y, si no existen, se
+    lanza ``FileNotFoundError``.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, offline=False,
+                 fetch_boundary=None, fetch_graph=None, fetch_features=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.fetch_boundary = fetch_boundary or ox.geocode_to_gdf
+        self.fetch_graph = fetch_graph or ox.graph_from_polygon
+        self.fetch_features = fetch_features or ox.features.features_from_polygon
+        self._boundaries = {}
+        self._lock = threading.RLock()  # la caché se comparte entre los hilos de descarga
+
+    def boundary(self, place):
+        """Devuelve el polígono del lugar, geocodificándolo una única vez."""
+        with self._lock:
+            if place not in self._boundaries:
+                query = {"kind": "boundary", "place": place}
+                gdf = self._get(query, ".parquet", _read_features, _write_features,
+                                lambda: self.fetch_boundary(place))
+                self._boundaries[place] = gdf.union_all()
+            return self._boundaries[place]
+
+    def graph(self, place, network_type="drive"):
+        """Devuelve la red de carreteras del lugar, descargándola solo si no está en caché."""
+        query = {"kind": "graph", "place": place, "network_type": network_type}
+        return self._get(query, ".graphml", _read_graph, _write_graph,
+                         lambda: self.fetch_graph(self.boundary(place), network_type=network_type))
+
+    def features(self, place, tags):
+        """Devuelve las entidades del lugar con esas etiquetas, descargándolas solo si no están en caché."""
+        query = {"kind": "features", "place": place, "tags": tags}
+        return self._get(query, ".parquet", _read_features, _write_features,
+                         lambda: self.fetch_features(self.boundary(place), tags=tags))
+
+    def polygon_graph(self, polygon, network_type="drive", **options):
+        """Devuelve la red de carreteras dentro de ``polygon`` (p. ej. una tesela).
+
+        ``options`` se pasan a ``fetch_graph`` (``simplify``, ``retain_all``,
+        ``truncate_by_edge``...) y forman parte de la clave de la caché. Si no
+        hay calles dentro se devuelve (y se guarda) un grafo vacío.
+        """
+        query = {"kind": "graph", "polygon": shapely.to_wkt(polygon, rounding_precision=7),
+                 "network_type": network_type, **options}
+        return self._get(query, ".graphml", _read_graph, _write_graph,
+                         lambda: _or_empty(lambda: self.fetch_graph(polygon, network_type=network_type, **options),
+                                           lambda: nx.MultiDiGraph(crs=WGS84)))
+
+    def polygon_features(self, polygon, tags):
+        """Devuelve las entidades con esas etiquetas dentro de ``polygon`` (vacío si no hay ninguna)."""
+        query = {"kind": "features", "polygon": shapely.to_wkt(polygon, rounding_precision=7), "tags": tags}
+        return self._get(query, ".parquet", _read_features, _write_features,
+                         lambda: _or_empty(lambda: self.fetch_features(polygon, tags=tags),
+                                           lambda: gpd.GeoDataFrame(geometry=[], crs=WGS84)))
+
+    def key(self, query):
+        """Clave de la entrada: hash de la consulta normalizada."""
+        text = json.dumps(query, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def clear(self):
+        """Elimina todas las entradas de la caché."""
+        for name in self._files():
+            os.remove(os.path.join(self.directory, name))
+
+    def _get(self, query, extension, read, write, fetch):
+        key = self.key(query)
+        data_path = os.path.join(self.directory, key + extension)
+        meta_path = os.path.join(self.directory, key + ".json")
+
+        if os.path.exists(data_path) and os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if self.offline or time.time() - meta["created"] < self.ttl:
+                os.utime(meta_path)  # marca de último uso para la expulsión
+                return read(data_path, meta)
+
+        if self.offline:
+            raise FileNotFoundError(f"Modo offline: no hay datos en caché para {query}")
+
+        data = fetch()
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        meta = {"query": query, "created": time.time()}
+        write(data, data_path, meta)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=4)
+
+        with self._lock:
+            self._evict()
+        return data
+
+    def _files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return os.listdir(self.directory)
+
+    def _evict(self):
+        """Elimina las entradas usadas hace más tiempo hasta quedar por debajo de ``max_bytes``.
+
+        La entrada más reciente nunca se elimina.
+        """
+        entries = {}
+        for name in self._files():
+            key = name.split(".", 1)[0]
+            path = os.path.join(self.directory, name)
+            size, last_used = entries.get(key, (0, 0.0))
+            last_used = max(last_used, os.path.getmtime(path)) if name.endswith(".json") else last_used
+            entries[key] = (size + os.path.getsize(path), last_used)
+
+        total = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1])[:-1]:
+            if total <= self.max_bytes:
+                break
+            for name in self._files():
+                if name.startswith(key + "."):
+                    os.remove(os.path.join(self.directory, name))
+            total -= size
+
+
+def _or_empty(fetch, empty):
+    # OSMnx lanza InsufficientResponseError cuando la zona no tiene datos (p. ej. una tesela rural)
+    try:
+        return fetch()
+    except InsufficientResponseError:
+        return empty()
+
+
+def _write_graph(graph, path, meta):
+    ox.io.save_graphml(graph, path)
+
+
+def _read_graph(path, meta):
+    return ox.io.load_graphml(path)
+
+
+def _write_features(features, path, meta):
+    features, meta["json_columns"] = encode_list_columns(features)
+    features.to_parquet(path)
+
+
+def _read_features(path, meta):
+    return decode_list_columns(gpd.read_parquet(path), meta.get("json_columns", []))
@@ -0,0 +1,193 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+COMPACT_DIR = "grafo"
+ATTRIBUTES_FILE = "atributos.json"
+# Arrays del formato; cada uno se guarda como <nombre>.npy
+ARRAYS = ("node_ids", "node_order", "x", "y", "indptr", "indices", "keys", "length",
+          "geometry_offsets", "coords")
+
+
+class CompactGraph:
+    """Grafo de calles guardado como arrays de numpy (adyacencia CSR).
+
+    Los nodos se numeran por su posición: ``node_ids``, ``x`` e ``y`` tienen uno
+    por nodo. Las aristas que salen del nodo ``i`` son las posiciones
+    ``indptr[i]:indptr[i + 1]`` de ``indices`` (nodo destino), ``keys`` y
+    ``length``; la geometría de la arista ``e`` son las filas
+    ``geometry_offsets[e]:geometry_offsets[e + 1]`` de ``coords``. El resto de
+    atributos de nodos y aristas (los de ``nodos.geojson`` y ``aristas.geojson``)
+    se guardan aparte y solo se leen al convertir de vuelta a GeoDataFrames.
+    """
+
+    def __init__(self, arrays, attributes=None, directory=None):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self._attributes = attributes
+        self._directory = directory
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @property
+    def attributes(self):
+        """Atributos no numéricos (crs y columnas extra), leídos la primera vez que se piden."""
+        if self._attributes is None:
+            with open(os.path.join(self._directory, ATTRIBUTES_FILE), 'r', encoding='utf-8') as f:
+                self._attributes = json.load(f)
+        return self._attributes
+
+    def node_index(self, node_ids):
+        """Posición de uno o varios ``osmid`` de nodo (búsqueda binaria, sin diccionario)."""
+        node_ids = np.asarray(node_ids)
+        positions = np.searchsorted(self.node_ids, node_ids, sorter=self.node_order)
+        index = self.node_order[np.minimum(positions, self.num_nodes - 1)]
+        if not np.all(self.node_ids[index] == node_ids):
+            raise KeyError(f"Nodos no encontrados en el grafo: {node_ids[self.node_ids[index] != node_ids]}")
+        return index
+
+    def edge_sources(self):
+        """Posición del nodo origen de cada arista."""
+        return np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+
+    def neighbors(self, node_id):
+        """``osmid`` de los nodos a los que se llega desde ``node_id``."""
+        i = int(self.node_index(node_id))
+        return self.node_ids[self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def save(self, directory):
+        """Guarda el grafo en ``directory`` (un .npy por array y los atributos en JSON)."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, name + ".npy"), np.asarray(getattr(self, name)))
+        with open(os.path.join(directory, ATTRIBUTES_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.attributes, f, ensure_ascii=False)
+
+    @classmethod
+    def from_gdfs(cls, nodes, edges):
+        """Construye el grafo a partir de los GeoDataFrames de ``ox.graph_to_gdfs``.
+
+        ``nodes`` debe estar indexado por ``osmid`` y ``edges`` por ``(u, v, key)``,
+        igual que al leer ``nodos.geojson`` y ``aristas.geojson`` en ``load_geojson``.
+        """
+        node_ids = nodes.index.to_numpy(dtype=np.int64)
+        node_order = np.argsort(node_ids, kind="stable")
+        graph = cls({"node_ids": node_ids, "node_order": node_order,
+                     "x": nodes["x"].to_numpy(dtype=float), "y": nodes["y"].to_numpy(dtype=float),
+                     **{name: None for name in ARRAYS[4:]}})
+
+        # Aristas agrupadas por nodo origen, conservando el orden dentro de cada nodo
+        u = edges.index.get_level_values("u").to_numpy(dtype=np.int64)
+        v = edges.index.get_level_values("v").to_numpy(dtype=np.int64)
+        sources = graph.node_index(u)
+        order = np.argsort(sources, kind="stable")
+        edges = edges.iloc[order]
+
+        graph.indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=len(node_ids)))])
+        graph.indices = graph.node_index(v[order])
+        graph.keys = edges.index.get_level_values("key").to_numpy(dtype=np.int64)
+        graph.length = edges["length"].to_numpy(dtype=float)
+
+        coords, index = shapely.get_coordinates(edges.geometry.values, return_index=True)
+        graph.coords = coords
+        graph.geometry_offsets = np.concatenate([[0], np.cumsum(np.bincount(index, minlength=len(edges)))])
+
+        graph._attributes = {
+            "crs": nodes.crs.to_string() if nodes.crs is not None else None,
+            "nodes": _columns_to_json(nodes.drop(columns=["x", "y", nodes.geometry.name])),
+            "edges": _columns_to_json(edges.drop(columns=["length", edges.geometry.name])),
+            # Orden original de las columnas, con x, y, length y la geometría en su sitio
+            "node_order": list(nodes.columns),
+            "edge_order": list(edges.columns),
+        }
+        return graph
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Construye el grafo compacto a partir de un MultiDiGraph de OSMnx."""
+        import osmnx as ox
+        return cls.from_gdfs(*ox.graph_to_gdfs(graph))
+
+    def to_gdfs(self):
+        """Operación inversa de ``from_gdfs``: devuelve los GeoDataFrames de nodos y aristas."""
+        attributes = self.attributes
+        crs = attributes["crs"]
+
+        nodes = _columns_from_json(attributes["nodes"], len(self.node_ids))
+        nodes["x"] = np.asarray(self.x)
+        nodes["y"] = np.asarray(self.y)
+        nodes.index = pd.Index(np.asarray(self.node_ids), name="osmid")
+        nodes = gpd.GeoDataFrame(nodes, geometry=gpd.points_from_xy(self.x, self.y), crs=crs)
+        nodes = _reorder(nodes, attributes.get("node_order"))
+
+        sources = self.edge_sources()
+        index = pd.MultiIndex.from_arrays(
+            [self.node_ids[sources], self.node_ids[self.indices], np.asarray(self.keys)], names=["u", "v", "key"])
+        edges = _columns_from_json(attributes["edges"], self.num_edges)
+        edges["length"] = np.asarray(self.length)
+        edges.index = index
+        lines = shapely.linestrings(np.asarray(self.coords),
+                                    indices=np.repeat(np.arange(self.num_edges), np.diff(self.geometry_offsets)))
+        edges = gpd.GeoDataFrame(edges, geometry=lines, crs=crs)
+        edges = _reorder(edges, attributes.get("edge_order"))
+
+        return nodes, edges
+
+    def to_graph(self):
+        """Convierte el grafo compacto en un MultiDiGraph de OSMnx."""
+        import osmnx as ox
+        return ox.graph_from_gdfs(*self.to_gdfs())
+
+
+def load_compact(directory, mmap=True):
+    """Carga un grafo guardado con ``CompactGraph.save``.
+
+    Con ``mmap`` los arrays se proyectan en memoria desde disco en lugar de leerse,
+    así que la carga es inmediata y no copia datos. Los atributos se leen al usarse.
+    """
+    mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mode) for name in ARRAYS}
+    return CompactGraph(arrays, directory=directory)
+
+
+def geojson_to_compact(directory, output=None):
+    """Convierte ``nodos.geojson`` y ``aristas.geojson`` de ``directory`` al formato compacto."""
+    nodes = gpd.read_file(os.path.join(directory, "nodos.geojson")).set_index("osmid")
+    edges = gpd.read_file(os.path.join(directory, "aristas.geojson")).set_index(["u", "v", "key"])
+    graph = CompactGraph.from_gdfs(nodes, edges)
+    graph.save(output or os.path.join(directory, COMPACT_DIR))
+    return graph
+
+
+def _columns_to_json(frame):
+    # Por columnas y con los nulos como null, igual que en el GeoJSON
+    return {"columns": list(frame.columns),
+            "data": json.loads(frame.to_json(orient="values", force_ascii=False, double_precision=15,
+                                          default_handler=str))}
+
+
+def _columns_from_json(columns, length):
+    if not columns["columns"]:
+        return pd.DataFrame(index=range(length))
+    return pd.DataFrame(columns["data"], columns=columns["columns"])
+
+
+def _reorder(frame, order):
+    # Los atributos guardados antes de conservar el orden no lo traen
+    if order is None:
+        return frame
+    # La única columna que puede faltar es la geometría, si tenía otro nombre
+    missing = [column for column in order if column not in frame.columns]
+    if missing:
+        frame = frame.rename_geometry(missing[0])
+    return frame[order]
@@ -0,0 +1,218 @@
+import os
+import json
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import shapely
+from pandas.api.types import is_float_dtype
+
+CRS84 = "urn:ogc:def:crs:OGC:1.3:CRS84"
+SIBLING_FORMATS = {"parquet": ".parquet", "fgb": ".fgb"}
+FULL_PRECISION_COLUMNS = ("x", "y")  # coordenadas de los nodos: se escriben sin perder precisión
+
+
+def write_layers(directory, layers, precision=None, compact=False, siblings=(), max_workers=4):
+    """Escribe en paralelo varias capas en ``directory`` como ``<nombre>.geojson``.
+
+    ``layers`` es un diccionario ``{nombre: GeoDataFrame}``. ``siblings`` indica
+    formatos adicionales ("parquet", "fgb") que se guardan junto a cada GeoJSON
+    para recargarlos más rápido. Devuelve el tamaño en bytes de cada GeoJSON.
+    """
+    def write(name, gdf):
+        path = os.path.join(directory, name + ".geojson")
+        write_geojson(gdf, path, name, precision=precision, compact=compact)
+        for fmt in siblings:
+            write_sibling(gdf, os.path.join(directory, name + SIBLING_FORMATS[fmt]), fmt)
+        return os.path.getsize(path)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {name: pool.submit(write, name, gdf) for name, gdf in layers.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def write_geojson(gdf, path, name, precision=None, compact=False):
+    """Escribe un GeoDataFrame como FeatureCollection GeoJSON.
+
+    Propiedades y geometrías se serializan por columnas (pandas y shapely) en
+    lugar de entidad a entidad. La estructura es la del driver GeoJSON de GDAL
+    (``name``, ``crs`` y una entidad por línea), que es la que lee GAMA. Con
+    ``precision`` se redondean las coordenadas a ese número de decimales y con
+    ``compact`` se omiten los saltos de línea entre entidades.
+    """
+    header = {"type": "FeatureCollection", "name": name}
+    crs = _crs_member(gdf.crs)
+    if crs is not None:
+        header["crs"] = crs
+
+    separator = "," if compact else ",\n"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False, separators=(",", ":") if compact else None)[:-1])
+        f.write(',"features":[' if compact else ',\n"features": [\n')
+        f.write(separator.join(geojson_features(gdf, precision)))
+        f.write(']}' if compact else '\n]\n}\n')
+
+
+def write_geojson_parts(path, name, crs, parts):
+    """Escribe un GeoJSON uniendo ficheros con una entidad por línea, sin cargarlos en memoria.
+
+    ``parts`` son rutas de ficheros escritos con ``write_feature_lines``. La
+    estructura es la misma que la de ``write_geojson``. Devuelve el número de
+    entidades escritas.
+    """
+    header = {"type": "FeatureCollection", "name": name}
+    crs = _crs_member(crs)
+    if crs is not None:
+        header["crs"] = crs
+
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False)[:-1])
+        f.write(',\n"features": [\n')
+        for part in parts:
+            with open(part, 'r', encoding='utf-8') as lines:
+                for line in lines:
+                    f.write((",\n" if count else "") + line.rstrip("\n"))
+                    count += 1
+        f.write('\n]\n}\n')
+    return count
+
+
+def write_feature_lines(gdf, path, precision=None):
+    """Escribe las entidades de la capa en ``path``, una por línea (ver ``write_geojson_parts``)."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for feature in geojson_features(gdf, precision):
+            f.write(feature + "\n")
+
+
+def geojson_features(gdf, precision=None):
+    """Serializa cada fila del GeoDataFrame como una entidad GeoJSON (lista de cadenas)."""
+    gdf = _with_index_columns(gdf)
+    geometry_name = gdf.geometry.name
+
+    geometries = np.asarray(gdf.geometry.values, dtype=object)
+    if precision is not None:
+        geometries = shapely.transform(geometries, lambda coords: np.round(coords, precision))
+    geometry_json = shapely.to_geojson(geometries)
+
+    properties = gdf.drop(columns=geometry_name)
+    if len(properties.columns):
+        properties_json = _properties_json(_normalize_list_columns(properties))
+    else:
+        properties_json = ["{}"] * len(gdf)
+
+    return ['{"type":"Feature","properties":' + props + ',"geometry":' + (geom or "null") + '}'
+            for props, geom in zip(properties_json, geometry_json)]
+
+
+def geojson_size(gdf, precision=None):
+    """Tamaño aproximado en bytes que ocuparía la capa escrita con ``write_geojson``."""
+    return sum(len(feature.encode("utf-8")) + 2 for feature in geojson_features(gdf, precision))
+
+
+def write_sibling(gdf, path, fmt):
+    """Guarda una copia de la capa en GeoParquet o FlatGeobuf."""
+    gdf, _ = encode_list_columns(_with_index_columns(gdf))
+    if fmt == "parquet":
+        gdf.to_parquet(path)
+    else:
+        gdf.to_file(path, driver="FlatGeobuf")
+
+
+def encode_list_columns(gdf):
+    """Convierte a texto JSON las columnas con listas o diccionarios.
+
+    Parquet y FlatGeobuf no admiten listas mezcladas con nulos (p. ej. 'nodes'
+    de las vías). Devuelve la copia convertida y los nombres de esas columnas.
+    """
+    json_columns = [column for column in gdf.columns
+                    if column != gdf.geometry.name and gdf[column].dtype == object
+                    and gdf[column].map(lambda x: isinstance(x, (list, dict))).any()]
+    if not json_columns:
+        return gdf, json_columns
+
+    gdf = gdf.copy()
+    for column in json_columns:
+        gdf[column] = gdf[column].map(lambda x: json.dumps(x) if isinstance(x, (list, dict)) else None)
+    return gdf, json_columns
+
+
+def decode_list_columns(gdf, json_columns):
+    """Operación inversa de ``encode_list_columns``."""
+    for column in json_columns:
+        gdf[column] = gdf[column].map(lambda x: json.loads(x) if isinstance(x, str) else x)
+    return gdf
+
+
+def _properties_json(properties):
+    """Objeto JSON de propiedades de cada fila.
+
+    Los valores decimales se escriben con 10 decimales (como ``to_file``),
+    salvo las columnas de FULL_PRECISION_COLUMNS, que se escriben con la
+    representación más corta que recupera el mismo valor. Las columnas se
+    serializan por tramos consecutivos para conservar su orden.
+    """
+    pieces = []
+    for full, columns in itertools.groupby(properties.columns, key=lambda column: column in FULL_PRECISION_COLUMNS
+                                           and is_float_dtype(properties[column])):
+        frame = properties[list(columns)]
+        if full:
+            names = [json.dumps(str(column)) for column in frame.columns]
+            pieces.append([",".join(f"{name}:{_float_json(value)}" for name, value in zip(names, row))
+                           for row in frame.itertuples(index=False, name=None)])
+        else:
+            # Solo "\n" separa filas: pandas lo escapa dentro de las cadenas, pero no U+2028 y similares,
+            # que str.splitlines también trataría como saltos de línea
+            text = frame.to_json(orient="records", lines=True, force_ascii=False, date_format="iso",
+                                 default_handler=str).rstrip("\n")
+            rows = text.split("\n") if text else []
+            assert len(rows) == len(frame), "número de filas JSON distinto del de entidades"
+            pieces.append([row[1:-1] for row in rows])
+    return ["{" + ",".join(piece for piece in row if piece) + "}" for row in zip(*pieces)]
+
+
+def _float_json(value):
+    return json.dumps(float(value)) if np.isfinite(value) else "null"
+
+
+def _normalize_list_columns(properties):
+    """Pasa a texto los valores sueltos de las columnas que mezclan listas y otros tipos.
+
+    Es lo que hace ``to_file``: GDAL no lee una propiedad que unas veces es una
+    lista y otras un booleano o un número (p. ej. 'oneway' o 'reversed' de las
+    aristas simplificadas por OSMnx), pero sí listas junto a cadenas.
+    """
+    mixed = [column for column in properties.columns if properties[column].dtype == object
+             and properties[column].map(lambda x: isinstance(x, list)).any()
+             and properties[column].map(_is_loose_scalar).any()]
+    if not mixed:
+        return properties
+
+    properties = properties.copy()
+    for column in mixed:
+        properties[column] = properties[column].map(lambda x: str(x) if _is_loose_scalar(x) else x)
+    return properties
+
+
+def _is_loose_scalar(value):
+    # Ni lista, ni cadena, ni nulo
+    return not isinstance(value, (list, str)) and value is not None and not (isinstance(value, float)
+                                                                            and np.isnan(value))
+
+
+def _with_index_columns(gdf):
+    # Igual que GeoDataFrame.to_file: el índice se escribe si tiene nombre
+    if any(name is not None for name in gdf.index.names):
+        return gdf.reset_index()
+    return gdf
+
+
+def _crs_member(crs):
+    if crs is None:
+        return None
+    if crs.equals("EPSG:4326"):
+        name = CRS84
+    else:
+        authority = crs.to_authority()
+        name = f"urn:ogc:def:crs:{authority[0]}::{authority[1]}" if authority else crs.to_string()
+    return {"type": "name", "properties": {"name": name}}
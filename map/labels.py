@@ -0,0 +1,69 @@
+import math
+
+import numpy as np
+
+# Desplazamientos candidatos (en puntos) para la etiqueta de cada parada, por
+# orden de preferencia. Los dos primeros son los que se usaban originalmente.
+LABEL_OFFSETS = ((15, 10), (-15, -10), (15, -10), (-15, 10), (0, 18), (0, -18))
+LABEL_MIN_DISTANCE = 12  # separación mínima entre etiquetas, en puntos
+
+
+def place_labels(points, offsets=LABEL_OFFSETS, min_distance=LABEL_MIN_DISTANCE):
+    """Elige un desplazamiento para la etiqueta de cada punto evitando solapes.
+
+    ``points`` es un array (N, 2) en las mismas unidades que ``offsets`` y
+    ``min_distance`` (normalmente puntos de pantalla, ver ``data_to_points``).
+    Las etiquetas ya colocadas se guardan en una rejilla de celdas de lado
+    ``min_distance``, así que cada comprobación solo mira las 9 celdas vecinas.
+    Se usa el primer candidato libre; si ninguno lo está, el que queda más lejos
+    de la etiqueta más cercana. Devuelve un array (N, 2) con los desplazamientos.
+    """
+    offsets = np.asarray(offsets, dtype=float)
+    chosen = np.empty((len(points), 2))
+    grid = {}
+
+    for i, point in enumerate(np.asarray(points, dtype=float)):
+        best, best_gap = 0, -1.0
+        for j, candidate in enumerate(point + offsets):
+            gap = _nearest(grid, candidate, min_distance)
+            if gap >= min_distance:
+                best = j
+                break
+            if gap > best_gap:
+                best, best_gap = j, gap
+
+        chosen[i] = offsets[best]
+        position = point + offsets[best]
+        grid.setdefault(_cell(position, min_distance), []).append(position)
+
+    return chosen
+
+
+def data_to_points(ax, xy):
+    """Convierte coordenadas del mapa a puntos de pantalla de la figura de ``ax``."""
+    ax.apply_aspect()
+    return ax.transData.transform(xy) * 72 / ax.figure.dpi
+
+
+def metres_to_points(ax, metres):
+    """Convierte una distancia en metros a puntos de pantalla en el centro de ``ax`` (ejes en grados)."""
+    (left, right), (bottom, top) = ax.get_xlim(), ax.get_ylim()
+    lat = (bottom + top) / 2
+    degrees = metres / 111320  # metros por grado de latitud (aprox.)
+    start, end = data_to_points(ax, [((left + right) / 2, lat), ((left + right) / 2, lat + degrees)])
+    return float(np.hypot(*(end - start)))
+
+
+def _cell(position, size):
+    return math.floor(position[0] / size), math.floor(position[1] / size)
+
+
+def _nearest(grid, position, size):
+    """Distancia a la etiqueta más cercana en las celdas vecinas (``inf`` si no hay)."""
+    cx, cy = _cell(position, size)
+    nearest = math.inf
+    for i in (cx - 1, cx, cx + 1):
+        for j in (cy - 1, cy, cy + 1):
+            for other in grid.get((i, j), ()):
+                nearest = min(nearest, math.hypot(position[0] - other[0], position[1] - other[1]))
+    return nearest
@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+import osmnx as ox
+import pandas as pd
+import shapely
+
+from map.export import encode_list_columns
+
+MANIFEST_FILE = "manifest.json"
+# Se incrementa cuando cambia el formato de las salidas para forzar su regeneración
+MANIFEST_VERSION = 1
+
+
+class Manifest:
+    """Registro de las entradas con las que se generó cada etapa de un mapa.
+
+    Se guarda como ``manifest.json`` en el directorio del mapa. Una etapa está
+    al día si se ejecutó con las mismas entradas y sus salidas siguen existiendo.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST_FILE)
+        self.data = {"version": MANIFEST_VERSION, "layers": {}, "stages": {}}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.data = data
+
+    def is_fresh(self, stage, inputs, outputs):
+        """Indica si la etapa puede omitirse."""
+        entry = self.data["stages"].get(stage)
+        return (entry is not None and entry["inputs"] == inputs
+                and all(os.path.exists(output) for output in outputs))
+
+    def record(self, stage, inputs, outputs):
+        """Anota que la etapa se ha ejecutado con esas entradas."""
+        self.data["stages"][stage] = {
+            "inputs": inputs,
+            "outputs": list(outputs),
+            "updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+
+    def invalidate(self, *stages):
+        """Olvida esas etapas para que se repitan (p. ej. si otro proceso ha reescrito sus salidas)."""
+        for stage in stages:
+            self.data["stages"].pop(stage, None)
+
+    def set_layers(self, hashes):
+        """Guarda el hash de cada capa descargada."""
+        self.data["layers"] = dict(hashes)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=4)
+
+
+def hash_frame(gdf):
+    """Hash del contenido de un GeoDataFrame: columnas, índice, atributos y geometrías."""
+    digest = hashlib.sha256()
+    gdf, _ = encode_list_columns(gdf)
+    geometry_name = gdf.geometry.name
+
+    digest.update(json.dumps([str(column) for column in gdf.columns]).encode("utf-8"))
+    attributes = pd.DataFrame(gdf.drop(columns=geometry_name))
+    digest.update(pd.util.hash_pandas_object(attributes, index=True).values.tobytes())
+    digest.update(b"".join(wkb or b"" for wkb in shapely.to_wkb(gdf.geometry.values)))
+
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    """Hash del contenido de un fichero, o ``None`` si no existe."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_graph(graph):
+    """Hash del contenido de un grafo de OSMnx (nodos y aristas con sus atributos)."""
+    nodes, edges = ox.graph_to_gdfs(graph)
+    return hashlib.sha256((hash_frame(nodes) + hash_frame(edges)).encode("utf-8")).hexdigest()
@@ -1,58 +1,178 @@
 import os
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import osmnx as ox
+import geopandas as gpd
 import numpy as np
-import shapely.geometry
 import matplotlib.pyplot as plt
 import matplotlib.lines as mlines
 from shapely.geometry import Point
 import matplotlib.patches as mpatches
 
-
-def create_map(city, flag_image, flag_geojson):
-    """Crea y visualiza un mapa de la ciudad con carreteras y paradas de autobús."""
+import instrumentation
+
+from map.cache import OSMCache
+from map.compact import ATTRIBUTES_FILE, COMPACT_DIR, CompactGraph, load_compact
+from map.export import SIBLING_FORMATS, geojson_size, write_layers
+from map.labels import LABEL_MIN_DISTANCE, place_labels, data_to_points, metres_to_points
+from map.manifest import Manifest, hash_file, hash_frame, hash_graph
+from map.presets import RENDER_PRESETS
+from map.prune import prune_graph
+from map.render import draw_lines, draw_polygons, export_tiles, is_headless
+from map.snapping import snap_bus_stops, group_stops_by_edge, split_line
+
+# Colores del mapa
+MAP_STYLE = {
+    "roads":      (64 / 255, 64 / 255, 64 / 255),
+    "buildings":  (170 / 255, 170 / 255, 170 / 255),
+    "background": (242 / 255, 243 / 255, 244 / 255),
+}
+
+
+def create_map(city, flag_image, flag_geojson, cache=None, progress=None, force=False,
+               preset="completo", tiles=None, prune=False, route_distance=None, precision=None, compact=False,
+               siblings=()):
+    """Crea y visualiza un mapa de la ciudad con carreteras y paradas de autobús.
+
+    ``cache`` es la OSMCache de la que se leen las descargas (por defecto, la de map/cache).
+    ``progress`` es una función opcional ``progress(etapa, hechas, total)`` a la que se
+    notifica el avance de cada etapa. Las etapas de renderizado y exportación cuyas
+    entradas no han cambiado desde la última ejecución (según el manifest.json del
+    directorio del mapa) se omiten salvo con ``force``. ``preset`` es uno de los modos
+    de RENDER_PRESETS y ``tiles``, si se indica, un rango de zooms ``(min, max)`` para
+    exportar teselas XYZ en images/tiles/<ciudad> en lugar de una única imagen.
+    Con ``prune`` el grafo se reduce antes de exportarlo (ver ``prune_map``).
+    ``precision``, ``compact`` y ``siblings`` son las opciones de formato de ``export_geojson``.
+    Devuelve el grafo con las paradas integradas, los edificios y las paradas.
+    """
     # pylint: disable=invalid-name
+    with instrumentation.span("create_map", city=city):
+        directory = "map/geojson/" + city
+
+        # Obtenemos los datos
+        report_progress(progress, "descarga")
+        graph, buildings, bus_stops, _ = fetch_layers(city, cache=cache)
+
+        # Hash de cada capa: una etapa solo se repite si cambian las capas de las que depende
+        manifest = Manifest(directory)
+        hashes = {"carreteras": hash_graph(graph), "edificios": hash_frame(buildings),
+                  "paradas": hash_frame(bus_stops)}
+        manifest.set_layers(hashes)
+
+        graph, bus_stops = integrate_bus_stops_into_graph(graph, bus_stops, progress=progress)
+
+        if prune:
+            report_progress(progress, "poda")
+            graph, bus_stops = prune_map(directory, graph, bus_stops, route_distance=route_distance)
+            # La poda cambia el grafo y las paradas exportadas; con distancia depende también
+            # de rutas.geojson (``None`` si no existe y no se ha aplicado el filtro)
+            routes_hash = hash_file(os.path.join(directory, "rutas.geojson")) if route_distance is not None else None
+            hashes = dict(hashes, poda={"distancia": route_distance, "rutas": routes_hash})
+
+        if flag_image:
+            image_inputs = dict(hashes, preset=preset, tiles=list(tiles) if tiles else None)
+            if tiles:
+                image_path = os.path.join("images", "tiles", city)
+            else:
+                image_path = os.path.join("images", city + ".png")
+            if force or not manifest.is_fresh("imagen", image_inputs, [image_path]):
+                report_progress(progress, "renderizado")
+                if tiles:
+                    count = export_tiles(ox.graph_to_gdfs(graph, nodes=False), buildings, bus_stops, image_path,
+                                         range(tiles[0], tiles[1] + 1), MAP_STYLE)
+                    print(f"[INFO] {count} teselas exportadas correctamente.")
+                else:
+                    fig = render_map(graph, buildings, bus_stops, preset=preset)
+                    if not is_headless():
+                        plt.show()
+                    # Exportar el mapa a una imagen
+                    report_progress(progress, "exportación")
+                    export_image(fig, city, "png", dpi=RENDER_PRESETS[preset]["dpi"])
+                    # Libera la figura: create_map puede ejecutarse muchas veces en el mismo proceso
+                    plt.close(fig)
+                manifest.record("imagen", image_inputs, [image_path])
+            else:
+                print("[INFO] Imagen sin cambios, se omite.")
+
+        if flag_geojson:
+            # Capas que hay que reescribir y entradas de las que dependen; el formato
+            # de salida también cuenta, para que cambiarlo reescriba las capas
+            output_format = {"precision": precision, "compact": compact, "siblings": sorted(siblings)}
+            stages = {
+                "red": (dict({name: hashes[name] for name in ("carreteras", "paradas", "poda") if name in hashes},
+                             formato=output_format),
+                        ["nodos", "aristas", "paradas", COMPACT_DIR]),
+                "edificios": ({"edificios": hashes["edificios"], "formato": output_format}, ["edificios"]),
+            }
+            extensions = [".geojson"] + [SIBLING_FORMATS[fmt] for fmt in siblings]
+            layers = []
+            for stage, (inputs, stage_layers) in stages.items():
+                outputs = [os.path.join(directory, name + extension) for name in stage_layers
+                           for extension in ([""] if name == COMPACT_DIR else extensions)]
+                if force or not manifest.is_fresh(stage, inputs, outputs):
+                    layers += stage_layers
+                    manifest.record(stage, inputs, outputs)
+
+            if layers:
+                report_progress(progress, "exportación")
+                # Exportar el grafo y las paradas a Shapefile
+                export_geojson(directory, graph, buildings, bus_stops, precision=precision, compact=compact,
+                               siblings=siblings, layers=layers)
+            else:
+                print("[INFO] GeoJson sin cambios, se omite.")
+
+        if flag_image or flag_geojson:
+            manifest.save()
+
+        return graph, buildings, bus_stops
 
-    # Obtenemos los datos
-    graph = get_road_network(city)
-    buildings = get_buildings(city)
-    bus_stops = get_bus_stops(city)
 
-    graph, bus_stops = integrate_bus_stops_into_graph(graph, bus_stops)
+@instrumentation.traced("renderizado")
+def render_map(graph, buildings, bus_stops, preset="completo", label_distance=LABEL_MIN_DISTANCE,
+               label_units="screen"):
+    """Dibuja la red de carreteras, los edificios y las paradas con sus etiquetas.
+
+    Carreteras y edificios se dibujan cada uno como una única colección de matplotlib.
+    ``label_distance`` es la separación mínima entre etiquetas, en puntos de pantalla
+    (``label_units="screen"``) o en metros (``label_units="metric"``).
+    """
+    options = RENDER_PRESETS[preset]
+    scale = options["figsize"][0] / RENDER_PRESETS["completo"]["figsize"][0]  # título y leyenda
+    edges = ox.graph_to_gdfs(graph, nodes=False)
 
     # Crea una figura y un eje para la red de carreteras
-    fig, ax = ox.plot_graph(
-        graph,
-        figsize=(30, 30),
-        node_color='b',
-        node_size=0,
-        edge_color=(64/255, 64/255, 64/255),
-        show=False,
-        close=False
-    )
-
-    ax.set_facecolor((242 / 255, 243 / 255, 244 / 255))
+    fig, ax = plt.subplots(figsize=options["figsize"], facecolor="#111111")
+    ax.set_facecolor(MAP_STYLE["background"])
+    draw_lines(ax, edges.geometry.values, colors=MAP_STYLE["roads"], linewidths=1, zorder=1)
+
+    # Límites y aspecto como en ox.plot_graph (margen del 2% y sin ejes)
+    left, bottom, right, top = edges.total_bounds
+    pad_x, pad_y = (right - left) * 0.02, (top - bottom) * 0.02
+    ax.set_xlim(left - pad_x, right + pad_x)
+    ax.set_ylim(bottom - pad_y, top + pad_y)
+    ax.set_aspect(1 / np.cos(np.deg2rad((bottom + top) / 2)))
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    ax.get_xaxis().set_visible(False)
+    ax.get_yaxis().set_visible(False)
 
     if not buildings.empty:
-        buildings.plot(ax=ax, color=(170/255, 170/255, 170/255), alpha=0.5, label='Edificios')
+        draw_polygons(ax, buildings.geometry.values, facecolor=MAP_STYLE["buildings"], edgecolor="none",
+                      alpha=0.5, label='Edificios')
 
     # Si se encontraron paradas de autobús, plotea las paradas
     if not bus_stops.empty:
         bus_stops.plot(ax=ax, color='red', marker='o', markersize=0.1, label='Paradas de autobús')
 
-        # Almacena las posiciones de los textos para evitar solapamientos
-        text_positions = []  # Guarda las coordenadas de los textos ya colocados
-
-        # Itera sobre las paradas y coloca los textos con flechas
-        for idx, row in bus_stops.iterrows():
-            x, y = row.geometry.x, row.geometry.y  # Coordenadas de la parada
-            texto = str(row['id'])  # Texto del ID
-            dx, dy = 15, 10
-
-            # Verifica si el texto se solapa con otros textos ya colocados
-            for pos in text_positions:
-                if distance((x + dx, y + dy), pos) < 0.2:  # Si hay solapamiento
-                    dx, dy = -dx, -dy  # Cambia la dirección del desplazamiento
+        # Desplazamiento de cada etiqueta, evitando solapes en puntos de pantalla
+        xy = np.column_stack([bus_stops.geometry.x, bus_stops.geometry.y])
+        if label_units == "metric":
+            label_distance = metres_to_points(ax, label_distance)
+        offsets = place_labels(data_to_points(ax, xy), min_distance=label_distance)
 
+        # Coloca los textos con flechas
+        for (x, y), (dx, dy), texto in zip(xy, offsets, bus_stops['id'].astype(str)):
             # Añade la anotación con flecha
             ax.annotate(
                 text=texto,  # Texto del ID
@@ -63,36 +183,30 @@ def create_map(city, flag_image, flag_geojson):
                 color='black',  # Color del texto
                 ha='center',  # Alineación horizontal centrada
                 va='center',  # Alineación vertical centrada
-                arrowprops=dict(arrowstyle='->', color='black', lw=0.5)  # Flecha
+                arrowprops=dict(arrowstyle='->', color='black', lw=0.5) if options["arrows"] else None  # Flecha
             )
 
-            # Guarda la posición del texto para evitar solapamientos futuros
-            text_positions.append((x + dx, y + dy))
-
     # Personaliza el gráfico
-    ax.set_title('Red de carreteras y paradas de autobús en Majadahonda', fontsize=32)
+    ax.set_title('Red de carreteras y paradas de autobús en Majadahonda', fontsize=32 * scale)
 
     # Crear manualmente los elementos de la leyenda
-    road_line = mlines.Line2D([], [], color=(64/255, 64/255, 64/255), linewidth=2, label='Carreteras')
+    road_line = mlines.Line2D([], [], color=MAP_STYLE["roads"], linewidth=2, label='Carreteras')
     bus_stop_marker = mlines.Line2D([], [], color='red', marker='o', linestyle='None',
-                                    markersize=10, label='Paradas de autobús')
-    building_patch = mpatches.Patch(color=(170/255, 170/255, 170/255), alpha=0.5, label='Edificios')
+                                    markersize=10 * scale, label='Paradas de autobús')
+    building_patch = mpatches.Patch(color=MAP_STYLE["buildings"], alpha=0.5, label='Edificios')
 
     # Añadir la leyenda
-    plt.legend(handles=[road_line, bus_stop_marker, building_patch], prop={'size': 28})
+    plt.legend(handles=[road_line, bus_stop_marker, building_patch], prop={'size': 28 * scale})
 
-    if flag_image:
-        plt.show()
-        # Exportar el mapa a una imagen
-        export_image(fig, city, "png")
+    return fig
 
-    if flag_geojson:
-        # Exportar el grafo y las paradas a Shapefile
-        export_geojson("map/geojson/"+city, graph, buildings, bus_stops)
 
+@instrumentation.traced("snapping")
+def integrate_bus_stops_into_graph(G, bus_stops, progress=None, first_node_id=None):
+    """Integra las paradas de autobús conectándolas a la arista más cercana.
 
-def integrate_bus_stops_into_graph(G, bus_stops):
-    """Integra las paradas de autobús conectándolas a la arista más cercana."""
+    Los nodos nuevos se numeran desde ``first_node_id`` (por defecto, el mayor id del grafo más uno).
+    """
     new_g = G.copy()
     nodes, edges = ox.graph_to_gdfs(new_g)
 
@@ -100,133 +214,223 @@ def integrate_bus_stops_into_graph(G, bus_stops):
     new_bus_stops["node_id"] = None  # Nueva columna para los nodos asignados
     new_bus_stops["geometry"] = None  # Se actualizarán las geometrías con las nuevas posiciones
 
-    for idx, row in bus_stops.iterrows():
-        bus_point = row.geometry
-        closest_edge = None
-        min_distance = float('inf')
-        projected_point = None
-
-        # Buscar la arista más cercana
-        for edge_idx, edge in edges.iterrows():
-            line = edge.geometry  # Línea de la arista
-            proj = line.interpolate(line.project(bus_point))  # Proyectar parada sobre la arista
-            dist = bus_point.distance(proj)
-
-            if dist < min_distance:
-                min_distance = dist
-                closest_edge = edge_idx  # edge_idx es (u, v, key)
-                projected_point = proj
-
-        #print("Arista más cercana: ", closest_edge)
-
-        # Si encontramos una arista válida, agregar la parada como nodo
-        if closest_edge and projected_point:
-            u, v, key = closest_edge  # Extraer nodos de la arista
-            edge_data = G.get_edge_data(u, v, key).copy() # Copiamos los atributos de la arista
-
-            new_node = max(new_g.nodes) + 1  # Nuevo ID de nodo
-
-            if new_g.has_node(u) and new_g.has_node(v):
-                pass
-            else:
-                print(f"Error: No se puede agregar la arista ({u}, {v}) porque uno de los nodos no existe")
-
+    # Arista más cercana y punto proyectado de todas las paradas en bloque
+    snapped = snap_bus_stops(edges, bus_stops)
+    stops_by_edge = group_stops_by_edge(bus_stops.index, snapped)
+    total_stops, done_stops = len(bus_stops), 0
+    report_progress(progress, "snapping", done_stops, total_stops)
+
+    # IDs de los nuevos nodos a partir del mayor existente
+    if first_node_id is None:
+        first_node_id = max(new_g.nodes) + 1 if len(new_g) else 0
+    node_ids = itertools.count(first_node_id)
+    edge_geometries = edges.geometry
+
+    # Cada arista se divide una única vez en N+1 tramos, uno por cada parada
+    for (u, v, key), stops in stops_by_edge.items():
+        edge_data = new_g.get_edge_data(u, v, key).copy()  # Copiamos los atributos de la arista
+        line = edge_geometries.loc[(u, v, key)]
+        new_g.remove_edge(u, v, key)
+
+        chain = [u]
+        for offset, idx, projected_point in stops:
+            new_node = next(node_ids)
             new_g.add_node(new_node, x=projected_point.x, y=projected_point.y)
+            chain.append(new_node)
 
-            # print("Creamos nodo: ", new_node, projected_point.x, projected_point.y)
-
-            if new_g.has_edge(u, v, key):
-                #print("Eliminando arista ", u, v)
-                new_g.remove_edge(u, v, key)
-            else:
-                pass
-                # print("Arista ", u, v, " no existe"
-
-            edge_data['geometry'] = shapely.geometry.LineString(
-                [(new_g.nodes[u]["x"], new_g.nodes[u]["y"]),
-                 (new_g.nodes[new_node]["x"], new_g.nodes[new_node]["y"])]
-            )
-            new_g.add_edge(u, new_node, **edge_data)
-            # print("Creamos arista1: ", u, new_node)
-
-            edge_data['geometry'] = shapely.geometry.LineString(
-                [(new_g.nodes[new_node]["x"], new_g.nodes[new_node]["y"]),
-                (new_g.nodes[v]["x"], new_g.nodes[v]["y"])]
-            )
-            new_g.add_edge(new_node, v, **edge_data)
-            # print("Creamos arista2: ", new_node, v)
-
-            if new_g.has_edge(u, new_node) and new_g.has_edge(new_node, v):
-                # print(f"Conexión correcta: ({u}, {new_node}) y ({new_node}, {v})")
-                pass
-            else:
-                print(f"Error: No se crearon correctamente las conexiones desde {u} hacia {v}")
-
-            #print("\n")
             # Actualizar bus_stops con el nuevo nodo y coordenadas
             new_bus_stops.at[idx, "node_id"] = new_node
             new_bus_stops.at[idx, "geometry"] = Point(projected_point.x, projected_point.y)
-
+        chain.append(v)
+
+        segments = split_line(line, stops)
+        for start, end, segment in zip(chain, chain[1:], segments):
+            segment_data = dict(edge_data, geometry=segment)
+            # La longitud de cada tramo es proporcional a su parte de la geometría
+            if "length" in edge_data and line.length > 0:
+                segment_data["length"] = edge_data["length"] * segment.length / line.length
+            new_g.add_edge(start, end, **segment_data)
+
+        done_stops += len(stops)
+        report_progress(progress, "snapping", done_stops, total_stops)
+
+    instrumentation.count("paradas", total_stops)
+    instrumentation.count("paradas_integradas", done_stops)
+    instrumentation.count("aristas_divididas", len(stops_by_edge))
     return new_g, new_bus_stops
 
 
-def get_road_network(city, network_type="drive"):
+@instrumentation.traced("poda")
+def prune_map(directory, graph, bus_stops, route_distance=None):
+    """Poda el grafo con ``prune_graph`` e informa de la reducción.
+
+    Con ``route_distance`` solo se conservan las calles a menos de esa distancia
+    (en metros) de los recorridos de ``rutas.geojson`` del directorio del mapa
+    (ver ``create_route_paths``), si existe.
+    """
+    routes = None
+    if route_distance is not None:
+        routes_path = os.path.join(directory, "rutas.geojson")
+        if os.path.exists(routes_path):
+            routes = gpd.read_file(routes_path).geometry
+        else:
+            print("[INFO] No hay rutas.geojson; se omite el filtro por distancia a las rutas.")
+
+    size_before = sum(geojson_size(layer) for layer in graph_layers(graph))
+    try:
+        pruned, bus_stops, counts = prune_graph(graph, bus_stops, routes=routes, route_distance=route_distance)
+    except ValueError as e:
+        if routes is None:
+            raise
+        raise ValueError(f"{e} de {routes_path}; comprueba que las rutas son de esta ciudad "
+                         f"o aumenta la distancia") from None
+    size_after = sum(geojson_size(layer) for layer in graph_layers(pruned))
+    instrumentation.count("aristas_eliminadas", graph.number_of_edges() - pruned.number_of_edges())
+    instrumentation.count("bytes_ahorrados", size_before - size_after)
+
+    before, after = counts["antes"], counts["despues"]
+    print(f"[INFO] Poda: nodos {before['nodos']} -> {after['nodos']}, aristas {before['aristas']} -> "
+          f"{after['aristas']}, paradas conectadas {before['paradas']} -> {after['paradas']}.")
+    print(f"[INFO] Tamaño de nodos y aristas: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB "
+          f"(x{size_before / max(size_after, 1):.2f} más pequeño).")
+
+    return pruned, bus_stops
+
+
+@instrumentation.traced("descarga")
+def fetch_layers(city, cache=None, max_workers=3):
+    """Obtiene en paralelo carreteras, edificios y paradas de la ciudad.
+
+    Las tres capas comparten la misma caché, de modo que el límite de la ciudad
+    se geocodifica una sola vez. Devuelve el grafo, los edificios, las paradas y
+    un diccionario con el tiempo en segundos de cada capa.
+    """
+    cache = cache or OSMCache()
+    layers = {"carreteras": get_road_network, "edificios": get_buildings, "paradas": get_bus_stops}
+
+    def timed(get_layer):
+        start = time.perf_counter()
+        result = get_layer(city, cache=cache)
+        return result, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {name: pool.submit(timed, get_layer) for name, get_layer in layers.items()}
+        results = {name: future.result() for name, future in futures.items()}
+
+    timings = {name: elapsed for name, (_, elapsed) in results.items()}
+    for name, elapsed in timings.items():
+        print(f"[INFO] Capa '{name}' obtenida en {elapsed:.2f} s.")
+
+    return results["carreteras"][0], results["edificios"][0], results["paradas"][0], timings
+
+
+def report_progress(progress, stage, done=None, total=None):
+    """Notifica el avance de una etapa si se ha indicado una función de progreso."""
+    if progress is not None:
+        progress(stage, done, total)
+
+
+def get_road_network(city, network_type="drive", cache=None):
     """Obtiene la red de carreteras de la ciudad."""
-    return ox.graph_from_place(city, network_type=network_type)
+    return (cache or OSMCache()).graph(city, network_type=network_type)
 
 
-def get_buildings(city):
+def get_buildings(city, cache=None):
     """Obtiene las edificaciones de la ciudad."""
-    return ox.features.features_from_place(city, tags={'building': True})
+    return (cache or OSMCache()).features(city, tags={'building': True})
 
 
-def get_bus_stops(city):
+def get_bus_stops(city, cache=None):
     """Obtiene las paradas de autobús de la ciudad."""
     tags = {'highway': 'bus_stop'}
-    bus_stops = ox.features.features_from_place(city, tags)
+    bus_stops = (cache or OSMCache()).features(city, tags)
     bus_stops['id'] = range(1, len(bus_stops) + 1)
     return bus_stops
 
 
-def distance(p1, p2):
-    # pylint: disable=invalid-name
-    return np.sqrt((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2)
-
-
-def export_image(fig, file_name, file_format):
+@instrumentation.traced("export_imagen")
+def export_image(fig, file_name, file_format, dpi=600):
     directory = "images"
     # Crear el directorio si no existe
     check_directory(directory)
 
-    fig.savefig(directory + "/" + file_name + "." + file_format, dpi=600, pad_inches=0,
+    fig.savefig(directory + "/" + file_name + "." + file_format, dpi=dpi, pad_inches=0,
                 bbox_inches='tight', format=file_format)
 
     print("[INFO] Imagen exportada correctamente.")
 
 
-def export_geojson(directory, graph, buildings, bus_stops):
-    """Exporta el grafo y las paradas de autobús a GeoJson."""
+@instrumentation.traced("export_geojson")
+def export_geojson(directory, graph, buildings, bus_stops, precision=None, compact=False, siblings=(),
+                   layers=None):
+    """Exporta el grafo y las paradas de autobús a GeoJson.
+
+    ``precision`` redondea las coordenadas a ese número de decimales, ``compact``
+    escribe el GeoJSON sin saltos de línea y ``siblings`` guarda además cada capa
+    en los formatos indicados ("parquet", "fgb"). Con ``layers`` solo se escriben
+    las capas indicadas ("nodos", "aristas", "edificios", "paradas"). Junto con
+    nodos y aristas se guarda el grafo en formato compacto (ver map/compact.py).
+    """
     # Crear el directorio si no existe
     check_directory(directory)
 
-    # Convierte el grafo en GeoDataFrames (nodos y aristas)
-    nodos, aristas = ox.graph_to_gdfs(graph)
+    nodos, aristas = graph_layers(graph)
+    buildings = buildings[buildings.geometry.type.isin(['Polygon', 'MultiPolygon'])]
 
-    # Exporta los nodos
-    nodos.to_file(os.path.join(directory, "nodos.geojson"), driver="GeoJSON")
+    all_layers = {"nodos": nodos, "aristas": aristas, "edificios": buildings, "paradas": bus_stops}
+    if layers is not None:
+        all_layers = {name: all_layers[name] for name in layers if name in all_layers}
+    sizes = write_layers(directory, all_layers, precision=precision, compact=compact, siblings=siblings)
+    instrumentation.count("entidades_escritas", sum(len(layer) for layer in all_layers.values()))
+    instrumentation.count("bytes_escritos", sum(sizes.values()))
 
-    aristas["osmid"] = aristas["osmid"].apply(lambda x: x[0] if isinstance(x, list) else x)
-    # Exporta las aristas
-    aristas.to_file(os.path.join(directory, "aristas.geojson"), driver="GeoJSON")
+    if "nodos" in all_layers and "aristas" in all_layers:
+        CompactGraph.from_gdfs(nodos, aristas).save(os.path.join(directory, COMPACT_DIR))
 
-    buildings = buildings[buildings.geometry.type.isin(['Polygon', 'MultiPolygon'])]
-    # Exportar edificios
-    buildings.to_file(os.path.join(directory, "edificios.geojson"), driver="GeoJSON")
+    print("[INFO] Datos exportados a GeoJson correctamente.")
 
-    # Exporta las paradas de autobús
-    bus_stops.to_file(os.path.join(directory, "paradas.geojson"), driver="GeoJSON")
 
-    print("[INFO] Datos exportados a GeoJson correctamente.")
+def graph_layers(graph):
+    """Nodos y aristas del grafo tal y como se exportan a GeoJson."""
+    # Convierte el grafo en GeoDataFrames (nodos y aristas)
+    nodos, aristas = ox.graph_to_gdfs(graph)
+
+    # Nos quedamos con el primer osmid de las aristas simplificadas
+    osmid = aristas["osmid"]
+    if osmid.dtype == object:
+        first = osmid.explode()
+        aristas["osmid"] = first[~first.index.duplicated()]
+
+    return nodos, aristas
+
+
+def load_geojson(directory):
+    """Carga un mapa exportado con export_geojson (grafo, edificios y paradas).
+
+    El grafo se lee del formato compacto si existe y no es más antiguo que los GeoJSON.
+    """
+    compact_dir = os.path.join(directory, COMPACT_DIR)
+    attributes = os.path.join(compact_dir, ATTRIBUTES_FILE)
+    if os.path.exists(attributes) and os.path.getmtime(attributes) >= max(
+            os.path.getmtime(os.path.join(directory, name + ".geojson")) for name in ("nodos", "aristas")):
+        nodos, aristas = load_compact(compact_dir).to_gdfs()
+    else:
+        nodos = gpd.read_file(os.path.join(directory, "nodos.geojson")).set_index("osmid")
+        # OSMnx toma x/y como referencia; la geometría escrita puede diferir en el redondeo
+        nodos["geometry"] = gpd.points_from_xy(nodos["x"], nodos["y"], crs=nodos.crs)
+        aristas = gpd.read_file(os.path.join(directory, "aristas.geojson")).set_index(["u", "v", "key"])
+    graph = ox.graph_from_gdfs(nodos, aristas)
+
+    # No todas las ciudades tienen la capa de edificios
+    edificios = os.path.join(directory, "edificios.geojson")
+    if os.path.exists(edificios):
+        buildings = gpd.read_file(edificios)
+    else:
+        buildings = gpd.GeoDataFrame(geometry=[], crs=nodos.crs)
+
+    bus_stops = gpd.read_file(os.path.join(directory, "paradas.geojson"))
+
+    return graph, buildings, bus_stops
 
 
 def check_directory(directory):
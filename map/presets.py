@@ -0,0 +1,7 @@
+# Tamaño de la figura (pulgadas), resolución y estilo de etiquetas de cada modo.
+# Está aparte de map/render.py para poder consultarlos sin cargar matplotlib.
+RENDER_PRESETS = {
+    "completo": {"figsize": (30, 30), "dpi": 600, "arrows": True},
+    "normal":   {"figsize": (20, 20), "dpi": 300, "arrows": True},
+    "rapido":   {"figsize": (12, 12), "dpi": 150, "arrows": False},
+}
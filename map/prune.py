@@ -0,0 +1,109 @@
+import numpy as np
+import osmnx as ox
+import shapely
+
+STOP_ATTRIBUTE = "parada"  # marca temporal de los nodos de parada para que no se fusionen
+
+
+def prune_graph(graph, bus_stops, routes=None, route_distance=None, simplify=True):
+    """Reduce el grafo a la parte que necesita la simulación.
+
+    Se aplican en orden: (1) si se indican ``routes`` (geometrías de las líneas) y
+    ``route_distance``, solo se conservan las aristas a menos de ``route_distance``
+    metros de alguna línea; (2) se conserva la mayor componente fuertemente
+    conexa; (3) con ``simplify``, se fusionan las cadenas de nodos de grado 2
+    conservando los nodos de las paradas y la geometría real de las aristas.
+    Las paradas cuyo nodo desaparece se quedan sin ``node_id``. Si el filtro
+    por rutas no deja ninguna calle se lanza ``ValueError``.
+    Devuelve el grafo reducido, las paradas y el número de nodos, aristas y
+    paradas conectadas antes y después.
+    """
+    before = _counts(graph, bus_stops)
+    pruned = graph
+
+    if routes is not None and route_distance is not None:
+        pruned = restrict_to_routes(pruned, routes, route_distance)
+        if len(pruned) == 0:
+            # largest_component no admite un grafo vacío
+            raise ValueError(f"Ninguna calle está a menos de {route_distance} m de las rutas")
+
+    pruned = ox.truncate.largest_component(pruned, strongly=True)
+
+    if simplify:
+        pruned = collapse_interstitial_nodes(pruned, bus_stops["node_id"].dropna())
+
+    bus_stops = bus_stops.copy()
+    bus_stops["node_id"] = bus_stops["node_id"].where(bus_stops["node_id"].isin(pruned.nodes), None)
+
+    return pruned, bus_stops, {"antes": before, "despues": _counts(pruned, bus_stops)}
+
+
+def restrict_to_routes(graph, routes, distance):
+    """Subgrafo con las aristas a menos de ``distance`` metros de alguna de las ``routes``."""
+    edges = ox.projection.project_gdf(ox.graph_to_gdfs(graph, nodes=False))
+    routes = routes[~routes.is_empty & routes.notna()].to_crs(edges.crs)
+    tree = shapely.STRtree(routes.values)
+    near, _ = tree.query(edges.geometry.values, predicate="dwithin", distance=distance)
+    return graph.edge_subgraph(edges.index[np.unique(near)]).copy()
+
+
+def collapse_interstitial_nodes(graph, stop_nodes):
+    """Fusiona las aristas que pasan por nodos de grado 2 que no son paradas.
+
+    Usa ``ox.simplify_graph``, que reconstruye la geometría de cada arista
+    fusionada uniendo sus nodos en línea recta; aquí se sustituye por la unión
+    de las geometrías originales de los tramos, que ya están simplificados.
+    Los atributos que difieren entre tramos, que OSMnx guarda como listas, se
+    reducen a un único valor (ver ``_flatten_attributes``).
+    """
+    graph = graph.copy()
+    for node in stop_nodes:
+        if node in graph:
+            graph.nodes[node][STOP_ATTRIBUTE] = True
+    graph.graph["simplified"] = False  # el grafo de OSMnx ya viene simplificado
+
+    simplified = ox.simplify_graph(graph, node_attrs_include=[STOP_ATTRIBUTE], track_merged=True)
+
+    for _, _, data in simplified.edges(data=True):
+        merged = data.pop("merged_edges", None)
+        if merged:
+            data["geometry"] = _merge_lines([_edge_geometry(graph, u, v) for u, v in merged])
+            _flatten_attributes(data, next(iter(graph[merged[0][0]][merged[0][1]].values())))
+    for _, data in simplified.nodes(data=True):
+        data.pop(STOP_ATTRIBUTE, None)
+
+    return simplified
+
+
+def _edge_geometry(graph, u, v):
+    # simplify_graph se queda con la primera arista entre cada par de nodos;
+    # las aristas rectas de OSMnx no tienen geometría
+    data = next(iter(graph[u][v].values()))
+    if "geometry" in data:
+        return data["geometry"]
+    return shapely.LineString([(graph.nodes[n]["x"], graph.nodes[n]["y"]) for n in (u, v)])
+
+
+def _flatten_attributes(data, first):
+    # 'oneway' es cierto si lo es algún tramo; el resto toma el valor del primer
+    # tramo (las listas de OSMnx vienen de un set y no tienen un orden fijo)
+    for name, value in data.items():
+        if not isinstance(value, list):
+            continue
+        if name == "oneway":
+            data[name] = any(value)
+        else:
+            own = first.get(name)
+            data[name] = own if own is not None and not isinstance(own, list) else value[0]
+
+
+def _merge_lines(lines):
+    coords = [lines[0].coords[0]]
+    for line in lines:
+        coords.extend(line.coords[1:])
+    return shapely.LineString(coords)
+
+
+def _counts(graph, bus_stops):
+    return {"nodos": len(graph), "aristas": graph.number_of_edges(),
+            "paradas": int(bus_stops["node_id"].isin(graph.nodes).sum())}
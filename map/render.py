@@ -0,0 +1,102 @@
+import os
+import math
+
+import numpy as np
+import shapely
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.path import Path
+
+NON_INTERACTIVE_BACKENDS = {"agg", "cairo", "pdf", "pgf", "ps", "svg", "template"}
+
+TILE_SIZE = 256
+WEB_MERCATOR_EXTENT = 20037508.342789244
+
+
+def is_headless():
+    """Indica si matplotlib usa un backend sin ventana (plt.show() no haría nada)."""
+    return matplotlib.get_backend().lower() in NON_INTERACTIVE_BACKENDS
+
+
+def draw_lines(ax, geometries, **kwargs):
+    """Dibuja todas las líneas en un único LineCollection."""
+    lines = shapely.get_parts(np.asarray(geometries, dtype=object))
+    collection = LineCollection(_split_coordinates(lines), **kwargs)
+    ax.add_collection(collection)
+    return collection
+
+
+def draw_polygons(ax, geometries, **kwargs):
+    """Dibuja todos los polígonos, con sus huecos, en un único PathCollection."""
+    polygons = shapely.get_parts(np.asarray(geometries, dtype=object))
+    # Exterior e interiores en sentidos opuestos para que los huecos no se rellenen
+    polygons = shapely.orient_polygons(polygons[shapely.get_type_id(polygons) == 3])
+    rings, polygon_index = shapely.get_rings(polygons, return_index=True)
+    coords, ring_index = shapely.get_coordinates(rings, return_index=True)
+    # Cada anillo empieza con MOVETO y termina con CLOSEPOLY, como en make_compound_path
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    ring_starts = np.flatnonzero(np.diff(ring_index, prepend=-1))
+    codes[ring_starts] = Path.MOVETO
+    codes[ring_starts[1:] - 1] = Path.CLOSEPOLY
+    codes[-1:] = Path.CLOSEPOLY
+    polygon_starts = np.flatnonzero(np.diff(polygon_index[ring_index], prepend=-1))[1:]
+    paths = [Path(vertices, polygon_codes) for vertices, polygon_codes
+             in zip(np.split(coords, polygon_starts), np.split(codes, polygon_starts))] if len(coords) else []
+    collection = PathCollection(paths, **kwargs)
+    ax.add_collection(collection)
+    return collection
+
+
+def export_tiles(graph_edges, buildings, bus_stops, directory, zooms, style):
+    """Escribe una pirámide de teselas XYZ (``{z}/{x}/{y}.png``) en ``directory``.
+
+    Las capas se dibujan una sola vez, en Web Mercator, sobre una figura del
+    tamaño de una tesela; para cada tesela solo se cambian los límites del eje.
+    Devuelve el número de teselas escritas.
+    """
+    edges = graph_edges.to_crs(epsg=3857)
+    fig = plt.figure(figsize=(TILE_SIZE / 100, TILE_SIZE / 100), dpi=100)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_axis_off()
+    fig.set_facecolor(style["background"])
+
+    if not buildings.empty:
+        draw_polygons(ax, buildings.to_crs(epsg=3857).geometry.values, facecolor=style["buildings"],
+                      edgecolor="none", alpha=0.5)
+    draw_lines(ax, edges.geometry.values, colors=style["roads"], linewidths=1)
+    if not bus_stops.empty:
+        stops = bus_stops.to_crs(epsg=3857)
+        ax.scatter(stops.geometry.x, stops.geometry.y, color="red", s=4, zorder=3)
+
+    left, bottom, right, top = edges.total_bounds
+    count = 0
+    for zoom in zooms:
+        size = 2 * WEB_MERCATOR_EXTENT / 2 ** zoom
+        for x in range(_tile_index(left, size), _tile_index(right, size) + 1):
+            for y in range(_tile_index(-top, size), _tile_index(-bottom, size) + 1):
+                minx = -WEB_MERCATOR_EXTENT + x * size
+                maxy = WEB_MERCATOR_EXTENT - y * size
+                ax.set_xlim(minx, minx + size)
+                ax.set_ylim(maxy - size, maxy)
+
+                tile_dir = os.path.join(directory, str(zoom), str(x))
+                if not os.path.exists(tile_dir):
+                    os.makedirs(tile_dir)
+                fig.savefig(os.path.join(tile_dir, f"{y}.png"), dpi=100, facecolor=style["background"])
+                count += 1
+
+    plt.close(fig)
+    return count
+
+
+def _tile_index(coordinate, size):
+    return int(math.floor((coordinate + WEB_MERCATOR_EXTENT) / size))
+
+
+def _split_coordinates(geometries):
+    # Coordenadas de todas las geometrías de una vez, separadas por geometría
+    coords, index = shapely.get_coordinates(geometries, return_index=True)
+    if len(index) == 0:
+        return []
+    return np.split(coords, np.flatnonzero(np.diff(index)) + 1)
@@ -0,0 +1,122 @@
+import os
+import json
+
+import networkx as nx
+import geopandas as gpd
+from shapely.geometry import LineString
+
+from map.export import write_geojson
+from routes.validation import load_stop_index
+
+GEOJSON_DIR = "map/geojson"
+ROUTES_INDEX = "routes/index.json"
+
+
+def create_route_paths(city, graph, index_path=ROUTES_INDEX, geojson_dir=GEOJSON_DIR):
+    """Precalcula el recorrido de cada línea sobre el grafo de la ciudad.
+
+    Los códigos de parada de ``index_path`` (ver ``create_routes``) se resuelven a
+    los ``node_id`` que ``integrate_bus_stops_into_graph`` asignó a cada parada y
+    se calcula el camino más corto (por ``length``) entre paradas consecutivas.
+    Los tramos repetidos entre líneas se calculan una sola vez. Se escriben
+    ``rutas.geojson`` (una línea por ruta) y ``rutas_aristas.json`` (lista de
+    aristas ``[u, v, key]`` por ruta) en el directorio del mapa.
+    """
+    directory = os.path.join(geojson_dir, city)
+    stops = load_stop_index(city, geojson_dir)
+    with open(index_path, 'r', encoding='utf-8') as f:
+        lines = json.load(f)
+
+    segments = {}  # (origen, destino) -> aristas del camino más corto, o None si no hay
+    records = []
+    for line, codes in lines.items():
+        node_ids, missing = resolve_stops(codes, stops, graph)
+        edges, unreachable = [], []
+        for origin, destination in zip(node_ids, node_ids[1:]):
+            if (origin, destination) not in segments:
+                segments[(origin, destination)] = shortest_path_edges(graph, origin, destination)
+            path = segments[(origin, destination)]
+            if path is None:
+                unreachable.append([origin, destination])
+            else:
+                edges.extend(path)
+
+        records.append({
+            "line": line,
+            "node_ids": node_ids,
+            "missing": missing,
+            "unreachable": unreachable,
+            "length": sum(graph.edges[edge]["length"] for edge in edges),
+            "geometry": _path_geometry(graph, edges),
+            "edges": edges,
+        })
+
+    paths = gpd.GeoDataFrame(records, geometry="geometry", crs=graph.graph.get("crs"))
+    write_geojson(paths.drop(columns="edges"), os.path.join(directory, "rutas.geojson"), "rutas")
+    with open(os.path.join(directory, "rutas_aristas.json"), 'w', encoding='utf-8') as f:
+        json.dump({record["line"]: record["edges"] for record in records}, f)
+
+    print(f"[INFO] Recorridos de {len(records)} líneas calculados ({len(segments)} tramos distintos).")
+    return paths
+
+
+def resolve_stops(codes, stops, graph):
+    """Traduce los códigos de parada a nodos del grafo.
+
+    Si un código corresponde a varias paradas se elige la más cercana a la parada
+    anterior. Devuelve los nodos resueltos y los códigos que no están en el grafo.
+    """
+    node_ids, missing = [], []
+    for code in codes:
+        candidates = [node for node in (_graph_node(graph, stop["node_id"]) for stop in stops.get(code, ()))
+                      if node is not None]
+        if not candidates:
+            missing.append(code)
+            continue
+        if node_ids and len(candidates) > 1:
+            previous = graph.nodes[node_ids[-1]]
+            candidates.sort(key=lambda node: (graph.nodes[node]["x"] - previous["x"]) ** 2
+                                             + (graph.nodes[node]["y"] - previous["y"]) ** 2)
+        node_ids.append(candidates[0])
+    return node_ids, missing
+
+
+def _graph_node(graph, node_id):
+    # En los GeoJSON exportados por GDAL el node_id puede venir como texto
+    for node in (node_id, str(node_id)):
+        if node in graph:
+            return node
+    if isinstance(node_id, str) and node_id.isdigit() and int(node_id) in graph:
+        return int(node_id)
+    return None
+
+
+def shortest_path_edges(graph, origin, destination):
+    """Aristas ``(u, v, key)`` del camino más corto entre dos nodos, o ``None`` si no existe."""
+    if origin == destination:
+        return []
+    try:
+        _, nodes = nx.bidirectional_dijkstra(graph, origin, destination, weight="length")
+    except nx.NetworkXNoPath:
+        return None
+
+    # Entre aristas paralelas, la más corta
+    return [(u, v, min(graph[u][v], key=lambda key: graph[u][v][key]["length"]))
+            for u, v in zip(nodes, nodes[1:])]
+
+
+def _path_geometry(graph, edges):
+    coords = []
+    for edge in edges:
+        edge_coords = _edge_coords(graph, edge)
+        coords.extend(edge_coords[1:] if coords else edge_coords)
+    return LineString(coords) if len(coords) > 1 else None
+
+
+def _edge_coords(graph, edge):
+    # Como en map.prune: las aristas rectas de OSMnx no tienen geometría y se
+    # trazan entre las coordenadas de sus nodos
+    data = graph.edges[edge]
+    if "geometry" in data:
+        return list(data["geometry"].coords)
+    return [(graph.nodes[node]["x"], graph.nodes[node]["y"]) for node in edge[:2]]
@@ -0,0 +1,125 @@
+import numpy as np
+import shapely
+
+# Margen que se añade a la distancia mínima al buscar candidatas en el índice.
+# Cubre las diferencias de redondeo entre la distancia punto-línea que usa el
+# STRtree y la distancia punto-proyección que usa el método original.
+SNAP_TOLERANCE = 1e-9
+
+
+def snap_bus_stops(edges, bus_stops):
+    """Calcula la arista más cercana y el punto proyectado de cada parada.
+
+    Usa un STRtree sobre las geometrías de las aristas y proyecta todas las
+    paradas en bloque. Devuelve una lista con, para cada parada, ``None`` o una
+    tupla ``(edge_idx, projected_point, offset)`` donde ``edge_idx`` es la
+    etiqueta ``(u, v, key)`` de la arista y ``offset`` la distancia recorrida
+    sobre ella hasta el punto proyectado.
+    """
+    lines = np.asarray(edges.geometry.values, dtype=object)
+    points = np.asarray(bus_stops.geometry.values, dtype=object)
+    result = [None] * len(points)
+
+    valid = np.flatnonzero(~shapely.is_missing(points) & ~shapely.is_empty(points))
+    if len(lines) == 0 or len(valid) == 0:
+        return result
+
+    tree = shapely.STRtree(lines)
+
+    # Distancia mínima de cada parada a cualquier arista
+    (_, _), min_dist = tree.query_nearest(points[valid], return_distance=True, all_matches=False)
+
+    # Candidatas: todas las aristas dentro de esa distancia (más el margen)
+    stop_pos, edge_pos = tree.query(points[valid], predicate="dwithin",
+                                    distance=min_dist + SNAP_TOLERANCE)
+    stop_pos = valid[stop_pos]
+
+    # Proyección vectorizada, con la misma métrica que el método original
+    candidate_lines = lines[edge_pos]
+    candidate_points = points[stop_pos]
+    offsets = shapely.line_locate_point(candidate_lines, candidate_points)
+    projected = shapely.line_interpolate_point(candidate_lines, offsets)
+    dist = shapely.distance(candidate_points, projected)
+
+    # Por parada, la distancia menor; en caso de empate, la primera arista
+    order = np.lexsort((edge_pos, dist, stop_pos))
+    stop_sorted = stop_pos[order]
+    first = order[np.r_[True, stop_sorted[1:] != stop_sorted[:-1]]]
+
+    edge_index = edges.index
+    for i in first:
+        result[stop_pos[i]] = (edge_index[edge_pos[i]], projected[i], offsets[i])
+
+    return result
+
+
+def snap_bus_stops_brute_force(edges, bus_stops):
+    """Versión original (paradas × aristas) de ``snap_bus_stops``, usada como referencia."""
+    result = []
+    for bus_point in bus_stops.geometry:
+        closest_edge = None
+        min_distance = float('inf')
+        projected_point = None
+        offset = None
+
+        for edge_idx, line in zip(edges.index, edges.geometry):
+            position = line.project(bus_point)
+            proj = line.interpolate(position)
+            dist = bus_point.distance(proj)
+
+            if dist < min_distance:
+                min_distance = dist
+                closest_edge = edge_idx
+                projected_point = proj
+                offset = position
+
+        result.append((closest_edge, projected_point, offset) if closest_edge else None)
+
+    return result
+
+
+def group_stops_by_edge(stop_index, snapped):
+    """Agrupa las paradas por arista y las ordena a lo largo de ella.
+
+    Devuelve un diccionario ``{(u, v, key): [(offset, idx, projected_point), ...]}``.
+    Las paradas que caen en el mismo punto conservan su orden original.
+    """
+    stops_by_edge = {}
+    for idx, snap in zip(stop_index, snapped):
+        if snap is None:
+            continue
+        edge_idx, projected_point, offset = snap
+        stops_by_edge.setdefault(edge_idx, []).append((offset, idx, projected_point))
+
+    for stops in stops_by_edge.values():
+        stops.sort(key=lambda stop: stop[0])
+
+    return stops_by_edge
+
+
+def split_line(line, stops):
+    """Divide una línea en los puntos de las paradas conservando su geometría real.
+
+    ``stops`` es la lista ordenada que devuelve ``group_stops_by_edge``. Devuelve
+    ``len(stops) + 1`` tramos cuyos extremos interiores coinciden exactamente con
+    los puntos proyectados.
+    """
+    coords = np.asarray(line.coords)
+    # Distancia acumulada de cada vértice desde el inicio de la línea
+    vertex_offsets = np.r_[0.0, np.cumsum(np.hypot(*np.diff(coords[:, :2], axis=0).T))]
+
+    segments = []
+    start_offset, start_xy = 0.0, coords[0, :2]
+    for offset, _, point in stops:
+        segments.append(_segment(coords, vertex_offsets, start_offset, start_xy, offset, (point.x, point.y)))
+        start_offset, start_xy = offset, (point.x, point.y)
+    segments.append(_segment(coords, vertex_offsets, start_offset, start_xy,
+                             vertex_offsets[-1], coords[-1, :2]))
+
+    return segments
+
+
+def _segment(coords, vertex_offsets, start_offset, start_xy, end_offset, end_xy):
+    """Tramo entre dos distancias sobre la línea con los vértices intermedios originales."""
+    inner = coords[(vertex_offsets > start_offset) & (vertex_offsets < end_offset), :2]
+    return shapely.LineString(np.vstack([start_xy, inner, end_xy]))
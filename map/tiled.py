@@ -0,0 +1,256 @@
+import os
+import json
+import math
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import networkx as nx
+import numpy as np
+import geopandas as gpd
+import shapely
+from pyproj import CRS, Transformer
+
+import instrumentation
+from map.cache import OSMCache
+from map.compact import COMPACT_DIR
+from map.export import write_feature_lines, write_geojson_parts
+from map.manifest import Manifest
+from map.prune import collapse_interstitial_nodes
+from map.snapping import snap_bus_stops
+
+TILE_SIZE = 5000      # lado de cada tesela, en metros
+TILE_MARGIN = 500     # margen de red y paradas alrededor de cada tesela, en metros
+# Los nodos de parada de la tesela i se numeran desde TILE_NODE_OFFSET + i * TILE_NODE_STRIDE
+# (por encima de los ids de OSM, para que no choquen entre teselas)
+TILE_NODE_OFFSET = 10 ** 14
+TILE_NODE_STRIDE = 10 ** 6
+WGS84 = "EPSG:4326"
+
+
+def create_map_tiled(city, tile_size=TILE_SIZE, margin=TILE_MARGIN, network_type="drive", cache_options=None,
+                     workers=None, progress=None):
+    """Genera el GeoJson de la ciudad por teselas, para áreas demasiado grandes para create_map.
+
+    El límite de la ciudad se divide en una rejilla de teselas de ``tile_size``
+    metros que se procesan en paralelo (``workers`` procesos): cada una descarga
+    su red sin simplificar y sus paradas con un margen de ``margin`` metros,
+    integra las paradas y simplifica la red sin fusionar los nodos de las
+    aristas que cruzan a otra tesela, de modo que las teselas encajan en la
+    frontera. Cada tesela escribe solo los nodos, aristas, edificios y paradas
+    que le pertenecen (por la posición del nodo o del origen de la arista) y el
+    GeoJSON final se forma concatenando esos ficheros, así que la memoria
+    depende del tamaño de la tesela y no del de la ciudad.
+
+    ``cache_options`` son los argumentos de la OSMCache de cada proceso. A
+    diferencia de create_map, se conservan todas las componentes de la red y no
+    se generan imagen ni grafo compacto; las etapas de create_map que escriben
+    las mismas capas se invalidan (ver ``forget_map_outputs``). Devuelve un resumen con el
+    número de teselas, nodos, aristas, paradas y edificios escritos.
+    """
+    with instrumentation.span("create_map_tiled", city=city):
+        directory = os.path.join("map", "geojson", city)
+        cache_options = cache_options or {}
+        boundary = OSMCache(**cache_options).boundary(city)
+        grid = tile_grid(boundary, tile_size)
+        tiles = [(i, cell, polygon) for i, (cell, polygon) in enumerate(tile_polygons(boundary, grid))]
+        print(f"[INFO] {len(tiles)} teselas de {tile_size} m.")
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        forget_map_outputs(directory)
+
+        summary = {"tiles": len(tiles), "nodes": 0, "edges": 0, "stops": 0, "buildings": 0}
+        with tempfile.TemporaryDirectory(dir=directory) as tmp:
+            results = {}
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(process_tile, i, cell, polygon, boundary, grid, margin, network_type,
+                                       tmp, cache_options) for i, cell, polygon in tiles]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    result = future.result()
+                    results[result["tile"]] = result
+                    if progress is not None:
+                        progress("teselas", done, len(tiles))
+
+            parts = {layer: [os.path.join(tmp, f"{layer}_{i}.jsonl") for i, _, _ in tiles]
+                     for layer in ("nodos", "aristas", "edificios")}
+            crs = CRS(WGS84)
+            summary["nodes"] = write_geojson_parts(os.path.join(directory, "nodos.geojson"), "nodos", crs,
+                                                   parts["nodos"])
+            summary["edges"] = write_geojson_parts(os.path.join(directory, "aristas.geojson"), "aristas", crs,
+                                                   parts["aristas"])
+            summary["buildings"] = write_geojson_parts(os.path.join(directory, "edificios.geojson"), "edificios",
+                                                       crs, parts["edificios"])
+            summary["stops"] = merge_stops(os.path.join(directory, "paradas.geojson"), crs,
+                                           [(os.path.join(tmp, f"paradas_{i}.jsonl"), results[i]["stop_keys"])
+                                            for i, _, _ in tiles])
+
+        instrumentation.count("teselas", summary["tiles"])
+        instrumentation.count("entidades_escritas", summary["nodes"] + summary["edges"] + summary["stops"]
+                              + summary["buildings"])
+        print(f"[INFO] Datos exportados a GeoJson por teselas: {summary['nodes']} nodos, {summary['edges']} "
+              f"aristas, {summary['stops']} paradas y {summary['buildings']} edificios.")
+        return summary
+
+
+def forget_map_outputs(directory):
+    """Invalida las etapas de create_map cuyas salidas se van a reescribir y borra el grafo compacto.
+
+    Así la siguiente ejecución de create_map regenera el GeoJson en lugar de
+    dar por buena la red generada por teselas.
+    """
+    manifest = Manifest(directory)
+    manifest.invalidate("red", "edificios")
+    manifest.save()
+    compact_dir = os.path.join(directory, COMPACT_DIR)
+    if os.path.isdir(compact_dir):
+        shutil.rmtree(compact_dir)
+
+
+def tile_grid(boundary, tile_size):
+    """Rejilla de teselas: CRS proyectado (UTM) de la ciudad, origen y lado en metros."""
+    crs = gpd.GeoSeries([boundary], crs=WGS84).estimate_utm_crs()
+    left, bottom, _, _ = gpd.GeoSeries([boundary], crs=WGS84).to_crs(crs).total_bounds
+    return {"crs": crs.to_string(), "x0": float(left), "y0": float(bottom), "size": float(tile_size)}
+
+
+def tile_polygons(boundary, grid):
+    """Celdas ``(columna, fila)`` de la rejilla que tocan el límite y su parte del límite (en WGS84)."""
+    projected = gpd.GeoSeries([boundary], crs=WGS84).to_crs(grid["crs"]).iloc[0]
+    _, _, right, top = projected.bounds
+    columns = max(1, math.ceil((right - grid["x0"]) / grid["size"]))
+    rows = max(1, math.ceil((top - grid["y0"]) / grid["size"]))
+
+    cells = [(i, j) for i in range(columns) for j in range(rows)]
+    squares = gpd.GeoSeries([_cell_box(grid, cell) for cell in cells], crs=grid["crs"]).to_crs(WGS84)
+    for cell, square in zip(cells, squares):
+        polygon = square.intersection(boundary)
+        if not polygon.is_empty:
+            yield cell, polygon
+
+
+def cells_of(grid, x, y):
+    """Celda de la rejilla de cada punto (arrays de longitud y latitud)."""
+    transformer = Transformer.from_crs(WGS84, grid["crs"], always_xy=True)
+    px, py = transformer.transform(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    return list(zip(np.floor((px - grid["x0"]) / grid["size"]).astype(int).tolist(),
+                    np.floor((py - grid["y0"]) / grid["size"]).astype(int).tolist()))
+
+
+def process_tile(index, cell, polygon, boundary, grid, margin, network_type, tmp, cache_options):
+    """Procesa una tesela y escribe sus capas en ``tmp`` (una entidad por línea).
+
+    Se ejecuta en un proceso aparte. Devuelve un resumen pequeño con las claves
+    OSM de las paradas escritas, que ``merge_stops`` usa para eliminar duplicados.
+    """
+    from map import map as mapa
+
+    cell = tuple(cell)
+    cache = OSMCache(**cache_options)
+    square = gpd.GeoSeries([_cell_box(grid, cell)], crs=grid["crs"])
+    buffered = square.buffer(margin).to_crs(WGS84).iloc[0].intersection(boundary)
+
+    # Red sin simplificar: las aristas que cruzan la frontera son idénticas en las dos teselas
+    graph = cache.polygon_graph(buffered, network_type, simplify=False, retain_all=True, truncate_by_edge=True)
+    outside = [node for node, data in graph.nodes(data=True)
+               if not shapely.contains_xy(boundary, data["x"], data["y"])]
+    graph.remove_nodes_from(outside)
+    graph = _sorted_graph(graph)
+    if graph.number_of_edges() == 0:  # tesela sin calles (p. ej. solo campo); la caché devuelve un grafo vacío
+        for name in ("nodos", "aristas", "paradas"):
+            open(os.path.join(tmp, f"{name}_{index}.jsonl"), 'w', encoding='utf-8').close()
+        write_feature_lines(_tile_buildings(cache, polygon, grid, cell), os.path.join(tmp, f"edificios_{index}.jsonl"))
+        return {"tile": index, "stop_keys": []}
+
+    nodes = list(graph.nodes)
+    node_cells = dict(zip(nodes, cells_of(grid, [graph.nodes[n]["x"] for n in nodes],
+                                          [graph.nodes[n]["y"] for n in nodes])))
+    frontier = {node for u, v in graph.edges() if node_cells[u] != node_cells[v] for node in (u, v)}
+
+    # Cada parada la integra la tesela dueña de su arista más cercana
+    stops = _osm_columns(cache.polygon_features(buffered, {'highway': 'bus_stop'}))
+    edges = mapa.ox.graph_to_gdfs(graph, nodes=False)
+    snapped = snap_bus_stops(edges, stops)
+    stops = stops[_mask(s is not None and node_cells[s[0][0]] == cell for s in snapped)]
+    graph, stops = mapa.integrate_bus_stops_into_graph(graph, stops,
+                                                       first_node_id=TILE_NODE_OFFSET + index * TILE_NODE_STRIDE)
+    stop_nodes = set(stops["node_id"].dropna())
+    for node in stop_nodes:
+        node_cells[node] = cell
+
+    graph = collapse_interstitial_nodes(graph, stop_nodes | frontier)
+
+    nodos, aristas = mapa.graph_layers(graph)
+    nodos = nodos[_mask(node_cells[n] == cell for n in nodos.index)]
+    aristas = aristas[_mask(node_cells[u] == cell for u in aristas.index.get_level_values("u"))]
+
+    buildings = _tile_buildings(cache, polygon, grid, cell)
+
+    stops = stops.drop(columns="id", errors="ignore")
+    for name, layer in (("nodos", nodos), ("aristas", aristas), ("edificios", buildings), ("paradas", stops)):
+        write_feature_lines(layer, os.path.join(tmp, f"{name}_{index}.jsonl"))
+
+    return {"tile": index, "stop_keys": [list(key) for key in zip(stops["element_type"], stops["osmid"])]}
+
+
+def _tile_buildings(cache, polygon, grid, cell):
+    # Cada edificio pertenece a la tesela de su punto representativo
+    buildings = _osm_columns(cache.polygon_features(polygon, {'building': True}))
+    buildings = buildings[buildings.geometry.type.isin(['Polygon', 'MultiPolygon'])]
+    points = buildings.geometry.representative_point()
+    return buildings[_mask(c == cell for c in cells_of(grid, points.x, points.y))]
+
+
+def merge_stops(path, crs, parts):
+    """Une las paradas de las teselas quitando duplicados y las numera como ``get_bus_stops``.
+
+    Las paradas son pocas comparadas con la red, así que se procesan en memoria.
+    """
+    seen = set()
+    features = []
+    for part, keys in parts:
+        with open(part, 'r', encoding='utf-8') as f:
+            for line, key in zip(f, keys):
+                if tuple(key) in seen:
+                    continue
+                seen.add(tuple(key))
+                feature = json.loads(line)
+                feature["properties"]["id"] = len(features) + 1
+                features.append(json.dumps(feature, ensure_ascii=False, separators=(",", ":")))
+
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix=".jsonl", delete=False,
+                                     dir=os.path.dirname(path)) as f:
+        f.write("".join(feature + "\n" for feature in features))
+    try:
+        return write_geojson_parts(path, "paradas", crs, [f.name])
+    finally:
+        os.remove(f.name)
+
+
+def _cell_box(grid, cell):
+    x = grid["x0"] + cell[0] * grid["size"]
+    y = grid["y0"] + cell[1] * grid["size"]
+    return shapely.box(x, y, x + grid["size"], y + grid["size"])
+
+
+def _sorted_graph(graph):
+    # Mismo orden de aristas en todas las teselas: los empates del snapping se resuelven igual
+    ordered = nx.MultiDiGraph(**graph.graph)
+    ordered.add_nodes_from(sorted(graph.nodes(data=True), key=lambda item: item[0]))
+    ordered.add_edges_from(sorted(graph.edges(keys=True, data=True), key=lambda item: item[:3]))
+    return ordered
+
+
+def _mask(values):
+    # Lista vacía como máscara booleana (``gdf[[]]`` seleccionaría columnas)
+    return np.fromiter(values, dtype=bool)
+
+
+def _osm_columns(features):
+    # OSMnx 2 indexa por (element, id); en GeoJson se guardan como element_type y osmid
+    if list(features.index.names) == ["element", "id"]:
+        features = features.reset_index().rename(columns={"element": "element_type", "id": "osmid"})
+    for column in ("element_type", "osmid"):
+        if column not in features:  # resultado vacío de OSMCache
+            features[column] = None
+    return features
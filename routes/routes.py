@@ -1,7 +1,22 @@
+import os
+import re
+import glob
+import html
+import html.entities
 import json
-from bs4 import BeautifulSoup
-import numpy as np
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+import instrumentation
+from routes import validation
+
+# Clases de las dos divs que interesan de cada parada
+STOP_NAME_CLASS = 'Line_stopName__qAGtR'
+STOP_CODE_CLASS = 'Line_stopCodeSection__oJq+D'
+
+ROUTES_INPUT_DIR = "routes/input"
+ROUTES_OUTPUT_DIR = "routes/output"
+ROUTES_INDEX = "routes/index.json"  # índice de todas las líneas -> códigos de parada
 
 
 def read_json(ruta):
@@ -10,23 +25,256 @@ def read_json(ruta):
         return json.load(f)
 
 
-def extraer_info_parada(soup):
-    """Extrae el nombre y el código de la parada del HTML parseado."""
-    stop_name = soup.find('div', class_='Line_stopName__qAGtR')
-    stop_code = soup.find('div', class_='Line_stopCodeSection__oJq+D')
+def iter_json_array(ruta, chunk_size=1 << 16):
+    """Lee un array JSON por bloques y devuelve sus elementos uno a uno.
+
+    Solo se mantiene en memoria el elemento que se está decodificando, no el
+    fichero completo.
+    """
+    decoder = json.JSONDecoder()
+    with open(ruta, 'r', encoding='utf-8') as f:
+        buffer, eof = "", False
+
+        def skip_whitespace():
+            nonlocal buffer, eof
+            while True:
+                buffer = buffer.lstrip()
+                if buffer or eof:
+                    return
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+
+        skip_whitespace()
+        if not buffer.startswith('['):
+            raise ValueError(f"{ruta} no contiene un array JSON")
+        buffer = buffer[1:]
+
+        skip_whitespace()
+        if buffer.startswith(']'):
+            return
+
+        while True:
+            skip_whitespace()
+            try:
+                item, end = decoder.raw_decode(buffer)
+                # Si tras el elemento no aparece el separador, puede estar cortado
+                # (p. ej. un número al final del bloque): se lee más
+                if buffer[end:].lstrip()[:1] not in (',', ']') and not eof:
+                    raise json.JSONDecodeError("Elemento incompleto", buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+
+            yield item
+            buffer = buffer[end:]
+
+            skip_whitespace()
+            if buffer.startswith(','):
+                buffer = buffer[1:]
+            elif buffer.startswith(']'):
+                return
+            else:
+                raise ValueError(f"{ruta}: se esperaba ',' o ']' tras un elemento del array")
+
+
+# Etiquetas que html.parser de BeautifulSoup cierra al abrirlas
+_VOID_TAGS = frozenset((
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image',
+    'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source',
+    'spacer', 'track', 'wbr',
+))
+# Etiquetas cuyo texto no forma parte de ``.text``
+_HIDDEN_TEXT_TAGS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+# Etiquetas dentro de las que no se resumen los espacios
+_PRESERVE_WHITESPACE_TAGS = frozenset(('pre', 'textarea'))
+_ASCII_SPACES = ' \n\t\f\r'
+# Entidades con nombre, con o sin ';' final
+_ENTITIES = {name.rstrip(';'): character for name, character in html.entities.html5.items()}
+_NUMERIC_REFERENCE = {10: re.compile(r'^([0-9]+)(.*)'), 16: re.compile(r'^([0-9a-f]+)(.*)')}
+
+
+class _AllDivsClosed(Exception):
+    """Se lanza desde el parser para dejar de leer en cuanto se tienen todas las divs."""
+
+
+class _DivTextParser(HTMLParser):
+    """Recoge el texto de la primera ``<div>`` de cada clase, como lo haría BeautifulSoup.
+
+    El texto se agrupa en tramos entre dos marcas; un tramo solo de espacios
+    se queda en un espacio o un salto de línea.
+    """
+
+    def __init__(self, class_names):
+        super().__init__(convert_charrefs=False)
+        self.class_names = class_names
+        self.stack = []          # etiquetas abiertas
+        self.closed_voids = []   # etiquetas vacías cuyo cierre explícito se ignora
+        self.divs = {}           # clase -> posición de su div en ``stack``
+        self.open_divs = []      # clases cuya div sigue abierta
+        self.data = []           # tramo de texto en curso
+        self.parts = {class_name: [] for class_name in class_names}
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            self._flush()
+            self.closed_voids.append(tag)
+        else:
+            self._open(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self._open(tag, attrs)
+        self._close(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_voids:
+            self.closed_voids.remove(tag)
+        else:
+            self._close(tag)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_entityref(self, name):
+        self.data.append(_ENTITIES.get(name, '&' + name))
+
+    def handle_charref(self, name):
+        base = 16 if name[:1] in ('x', 'X') else 10
+        digits = name[1:] if base == 16 else name
+        try:
+            self.data.append(_numeric_character(int(digits, base)))
+        except ValueError:
+            # Referencia sin ';' seguida de texto: solo cuentan las cifras iniciales
+            match = _NUMERIC_REFERENCE[base].match(digits)
+            if match is None:
+                self.data.append(digits)
+            else:
+                self.data.append(_numeric_character(int(match.group(1), base)))
+                self.data.append(match.group(2))
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith('CDATA['):
+            # El contenido de CDATA sí es texto, aunque esté dentro de <template> o similares
+            self.data.append(data[len('CDATA['):])
+            self._flush(cdata=True)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def _open(self, tag, attrs):
+        self._flush()
+        if tag == 'div' and len(self.divs) < len(self.class_names):
+            # Si el atributo se repite se queda el último valor
+            classes = ''
+            for name, value in attrs:
+                if name == 'class':
+                    classes = value or ''
+            for class_name in self.class_names:
+                if class_name not in self.divs and (class_name == classes or class_name in classes.split()):
+                    self.divs[class_name] = len(self.stack)
+                    self.open_divs.append(class_name)
+        self.stack.append(tag)
+
+    def _close(self, tag):
+        # Se cierran también las etiquetas que sigan abiertas dentro; si no
+        # hay ninguna abierta con ese nombre, se ignora
+        self._flush()
+        if tag not in self.stack:
+            return
+        del self.stack[len(self.stack) - 1 - self.stack[::-1].index(tag):]
+        self.open_divs = [class_name for class_name in self.open_divs if self.divs[class_name] < len(self.stack)]
+        if not self.open_divs and len(self.divs) == len(self.class_names):
+            raise _AllDivsClosed()
+
+    def _flush(self, cdata=False):
+        if not self.data:
+            return
+        text = ''.join(self.data)
+        self.data = []
+        if not self.open_divs:
+            return
+        if not cdata and not _HIDDEN_TEXT_TAGS.isdisjoint(self.stack):
+            return
+        if not text.strip(_ASCII_SPACES) and _PRESERVE_WHITESPACE_TAGS.isdisjoint(self.stack):
+            text = '\n' if '\n' in text else ' '
+        for class_name in self.open_divs:
+            self.parts[class_name].append(text)
+
+
+def _numeric_character(number):
+    # Como BeautifulSoup: los valores no válidos se sustituyen por U+FFFD y los
+    # controles C1 se interpretan en windows-1252
+    if number == 0 or number > 0x10FFFF or 0xD800 <= number <= 0xDFFF:
+        return '\ufffd'
+    if 0x80 <= number <= 0x9F:
+        try:
+            return bytes((number,)).decode('cp1252')
+        except UnicodeDecodeError:
+            pass
+    return chr(number)
+
+
+def find_div_text(content, class_name):
+    """Texto de la primera ``<div>`` con esa clase, como ``soup.find('div', class_=...).text``.
+
+    Devuelve ``None`` si no existe ninguna.
+    """
+    return find_div_texts(content, (class_name,))[0]
+
+
+def find_div_texts(content, class_names):
+    """Como ``find_div_text`` para varias clases, leyendo el HTML una sola vez."""
+    parser = _DivTextParser(class_names)
+    try:
+        parser.feed(content)
+        parser.close()
+    except _AllDivsClosed:
+        pass
+    # Una div sin cerrar llega hasta el final del fragmento
+    return [''.join(parser.parts[class_name]) if class_name in parser.divs else None
+            for class_name in class_names]
+
+
+def extraer_info_parada(content):
+    """Extrae el nombre y el código de la parada del HTML de la parada."""
+    stop_name, stop_code = find_div_texts(content, (STOP_NAME_CLASS, STOP_CODE_CLASS))
     return {
-        "stopName": stop_name.text.strip() if stop_name else None,
-        "stopCodeSection": stop_code.text.strip().replace('#', '') if stop_code else None
+        "stopName": stop_name.strip() if stop_name is not None else None,
+        "stopCodeSection": stop_code.strip().replace('#', '') if stop_code is not None else None
     }
 
 
-def procesar_paradas(stop_contents):
-    """Procesa una lista de contenidos HTML para extraer información de las paradas."""
+def procesar_paradas(stop_contents, workers=None):
+    """Procesa una lista de contenidos HTML para extraer información de las paradas.
+
+    ``stop_contents`` puede ser cualquier iterable (p. ej. ``iter_json_array``).
+    Con ``workers`` mayor que 1 las paradas se reparten entre varios procesos.
+    """
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return _collect_stops(pool.map(extraer_info_parada, stop_contents, chunksize=64))
+    return _collect_stops(map(extraer_info_parada, stop_contents))
+
+
+def _collect_stops(infos):
     stops_dict = {}
     codigos_list = []
-    for i, content in enumerate(stop_contents):
-        soup = BeautifulSoup(content, 'html.parser')
-        info_parada = extraer_info_parada(soup)
+    for i, info_parada in enumerate(infos):
         if info_parada["stopName"] and info_parada["stopCodeSection"]:
             stops_dict[f"Parada {i + 1}"] = info_parada
             codigos_list.append(info_parada["stopCodeSection"])
@@ -40,52 +288,108 @@ def save_json(datos, ruta):
         print("[INFO]: Datos sobre la ruta especificada generados correctamente.")
 
 
-def check_route():
-    """Compara los códigos de parada del archivo JSON con las referencias del archivo GEOJSON."""
+def check_route(city, outputs=ROUTES_OUTPUT_DIR):
+    """Compara los códigos de parada de las rutas generadas con las referencias del GEOJSON de la ciudad."""
+    report = validation.check_routes(city, outputs)
+    validation.print_report(report)
+    return report
 
-    # Cargar los datos del archivo JSON
-    with open("output/651A.json", 'r', encoding='utf-8') as f:
-        paradas_json = json.load(f)
 
-    # Cargar los datos del archivo GEOJSON
-    with open("../map/geojson/paradas.geojson", 'r', encoding='utf-8') as f:
-        paradas_geojson = json.load(f)
+@instrumentation.traced("create_route")
+def create_route(input_json, output_json, progress=None):
+    """Procesa una ruta de routes/input y guarda sus paradas en routes/output.
 
-    # Extraer los códigos de parada del JSON
-    codigos_json = {parada['stopCodeSection'] for parada in paradas_json.values()}
+    ``progress`` es una función opcional ``progress(etapa, hechas, total)``.
+    """
+    stop_contents = iter_json_array(os.path.join(ROUTES_INPUT_DIR, input_json))
+    if progress is not None:
+        progress("procesado", None, None)
+    stops_dict, stops_id_list = procesar_paradas(stop_contents)
+    if progress is not None:
+        progress("exportación", None, None)
+    save_json(stops_dict, os.path.join(ROUTES_OUTPUT_DIR, output_json))
+    instrumentation.count("paradas", len(stops_id_list))
+    instrumentation.count("bytes_escritos", os.path.getsize(os.path.join(ROUTES_OUTPUT_DIR, output_json)))
+
+    print(stops_id_list)
+
+    return stops_dict, stops_id_list
 
-    # Extraer las referencias del GEOJSON
-    referencias_geojson = {feature['properties']['ref'] for feature in paradas_geojson['features'] if
-                           'ref' in feature['properties']}
 
-    # Encontrar las paradas en el JSON que no están en el GEOJSON
-    paradas_no_encontradas = codigos_json - referencias_geojson
+@instrumentation.traced("create_routes")
+def create_routes(inputs=ROUTES_INPUT_DIR, output_dir=ROUTES_OUTPUT_DIR, index_path=ROUTES_INDEX,
+                  workers=None, force=False):
+    """Procesa en paralelo todas las rutas de un directorio o de un patrón glob.
 
-    # Imprimir las paradas no encontradas
-    if paradas_no_encontradas:
-        print("Las siguientes paradas del JSON no se encontraron en el GEOJSON:")
-        for codigo in paradas_no_encontradas:
-            for nombre_parada, detalles in paradas_json.items():
-                if detalles['stopCodeSection'] == codigo:
-                    print(f"  - {nombre_parada} - {detalles['stopName']} (Código: {codigo})")
+    Cada entrada se guarda en ``output_dir`` con el nombre de ``output_name``. Las
+    rutas cuya salida es más reciente que la entrada no se vuelven a procesar
+    (salvo con ``force``). Al final se escribe en ``index_path`` un único JSON con
+    los códigos de parada de todas las líneas, que se devuelve como diccionario.
+    """
+    if os.path.isdir(inputs):
+        paths = sorted(glob.glob(os.path.join(inputs, "*.json")))
     else:
-        print("Todas las paradas del JSON se encontraron en el GEOJSON.")
+        paths = sorted(glob.glob(inputs))
 
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
 
-def create_route(input_json, output_json):
-    stop_contents = read_json("routes/input/" + input_json)
-    stops_dict, stops_id_list = procesar_paradas(stop_contents)
-    save_json(stops_dict, "routes/output/" + output_json)
+    outputs = {path: os.path.join(output_dir, output_name(os.path.basename(path))) for path in paths}
+    pending = [path for path in paths
+               if force or not os.path.exists(outputs[path])
+               or os.path.getmtime(outputs[path]) < os.path.getmtime(path)]
 
-    print(stops_id_list)
+    codes = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending_outputs = [outputs[path] for path in pending]
+            codes.update(zip(pending, pool.map(_process_route_file, pending, pending_outputs)))
+
+    # Las rutas sin cambios se toman de su salida ya generada
+    for path in paths:
+        if path not in codes:
+            codes[path] = [parada['stopCodeSection'] for parada in read_json(outputs[path]).values()]
+
+    index = {os.path.splitext(os.path.basename(outputs[path]))[0]: codes[path] for path in paths}
+    index = dict(sorted(index.items()))
+    if index_path:
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=4)
+
+    instrumentation.count("rutas_procesadas", len(pending))
+    instrumentation.count("rutas_sin_cambios", len(paths) - len(pending))
+    instrumentation.count("paradas", sum(len(line_codes) for line_codes in index.values()))
+    print(f"[INFO]: {len(pending)} rutas procesadas, {len(paths) - len(pending)} sin cambios.")
+    return index
+
+
+def output_name(input_name):
+    """Nombre de la salida de una ruta: '651_ida.json' -> '651A.json', '651_vuelta.json' -> '651B.json'."""
+    stem, extension = os.path.splitext(input_name)
+    if stem.endswith("_ida"):
+        stem = stem[:-len("_ida")] + "A"
+    elif stem.endswith("_vuelta"):
+        stem = stem[:-len("_vuelta")] + "B"
+    return stem + (extension or ".json")
+
+
+def _process_route_file(input_path, output_path):
+    stops_dict, stops_id_list = procesar_paradas(iter_json_array(input_path))
+    save_json(stops_dict, output_path)
+    return stops_id_list
 
 
 # Definir la función de demanda
 def Dem(t):
+    import numpy as np
     return 1 + 0.5 * np.sin((2 * np.pi / 10) * (t - 5)) + 0.5 * np.sin((2 * np.pi / 10) * (t - 16))
 
 
 if __name__ == '__main__':
+    # Solo el ejemplo necesita numpy y matplotlib; procesar rutas no los carga
+    import numpy as np
+    import matplotlib.pyplot as plt
+
     # Crear un rango de tiempo de 0 a 24 horas
     t_values = np.linspace(0, 24, 1000)
     dem_values = Dem(t_values)
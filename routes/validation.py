@@ -0,0 +1,131 @@
+import os
+import glob
+import json
+import difflib
+import unicodedata
+from collections import Counter
+
+GEOJSON_DIR = "map/geojson"
+STOP_INDEX_FILE = "paradas_index.json"
+
+
+def load_stop_index(city, geojson_dir=GEOJSON_DIR):
+    """Devuelve el índice código de parada -> paradas de ``paradas.geojson`` de la ciudad.
+
+    El índice se guarda en ``paradas_index.json`` junto al GeoJSON y solo se
+    reconstruye cuando este cambia (tamaño o fecha de modificación). Cada código
+    (propiedad ``ref``, que puede tener varios separados por ';') apunta a la
+    lista de paradas que lo usan, con su nombre, id, nodo y coordenadas.
+    """
+    directory = os.path.join(geojson_dir, city)
+    source = os.path.join(directory, "paradas.geojson")
+    index_path = os.path.join(directory, STOP_INDEX_FILE)
+    stat = os.stat(source)
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get("source") == signature:
+            return index["stops"]
+
+    with open(source, 'r', encoding='utf-8') as f:
+        features = json.load(f)["features"]
+
+    stops = {}
+    for feature in features:
+        properties = feature["properties"]
+        for ref in (properties.get("ref") or "").split(";"):
+            ref = ref.strip()
+            if ref:
+                stops.setdefault(ref, []).append({
+                    "name": properties.get("name"),
+                    "id": properties.get("id"),
+                    "node_id": properties.get("node_id"),
+                    "coordinates": (feature.get("geometry") or {}).get("coordinates"),
+                })
+
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump({"source": signature, "stops": stops}, f, ensure_ascii=False)
+
+    return stops
+
+
+def check_routes(city, outputs="routes/output", geojson_dir=GEOJSON_DIR, suggestions=3):
+    """Comprueba las salidas de ruta contra las paradas de la ciudad en una sola pasada.
+
+    ``outputs`` es un directorio de salidas de ruta, un patrón glob o una lista de
+    ficheros. Devuelve un informe por línea con los códigos que faltan en el
+    GeoJSON (con las paradas de nombre más parecido), los códigos repetidos en la
+    ruta y los códigos que corresponden a más de una parada del GeoJSON.
+    """
+    stops = load_stop_index(city, geojson_dir)
+    names = _names_index(stops)
+    candidates = list(names)
+
+    if isinstance(outputs, str):
+        pattern = os.path.join(outputs, "*.json") if os.path.isdir(outputs) else outputs
+        outputs = sorted(glob.glob(pattern))
+
+    report = {}
+    for path in outputs:
+        with open(path, 'r', encoding='utf-8') as f:
+            route = json.load(f)
+
+        codes = [detalles['stopCodeSection'] for detalles in route.values()]
+        missing = []
+        for nombre_parada, detalles in route.items():
+            code = detalles['stopCodeSection']
+            if code not in stops:
+                missing.append({
+                    "stop": nombre_parada,
+                    "name": detalles['stopName'],
+                    "code": code,
+                    "suggestions": _similar_stops(detalles['stopName'], names, candidates, suggestions),
+                })
+
+        report[os.path.splitext(os.path.basename(path))[0]] = {
+            "total": len(codes),
+            "missing": missing,
+            "duplicates": sorted(code for code, count in Counter(codes).items() if count > 1),
+            "ambiguous": sorted({code for code in codes if len(stops.get(code, ())) > 1}),
+        }
+
+    return report
+
+
+def print_report(report):
+    """Imprime el informe de ``check_routes``."""
+    for line, result in report.items():
+        if not result["missing"]:
+            print(f"[{line}] Todas las paradas ({result['total']}) se encontraron en el GEOJSON.")
+        else:
+            print(f"[{line}] {len(result['missing'])} de {result['total']} paradas no se encontraron en el GEOJSON:")
+            for parada in result["missing"]:
+                similares = ", ".join(f"{s['name']} ({s['ref']})" for s in parada["suggestions"]) or "ninguna"
+                print(f"  - {parada['stop']} - {parada['name']} (Código: {parada['code']}). "
+                      f"Parecidas: {similares}")
+        if result["duplicates"]:
+            print(f"  Códigos repetidos en la ruta: {', '.join(result['duplicates'])}")
+        if result["ambiguous"]:
+            print(f"  Códigos con varias paradas en el GEOJSON: {', '.join(result['ambiguous'])}")
+
+
+def _normalize(name):
+    # Minúsculas y sin tildes para comparar nombres
+    name = unicodedata.normalize("NFKD", name or "")
+    return "".join(c for c in name if not unicodedata.combining(c)).lower().strip()
+
+
+def _names_index(stops):
+    names = {}
+    for ref, features in stops.items():
+        for feature in features:
+            if feature["name"]:
+                names.setdefault(_normalize(feature["name"]), []).append({"ref": ref, "name": feature["name"]})
+    return names
+
+
+def _similar_stops(name, names, candidates, n):
+    matches = difflib.get_close_matches(_normalize(name), candidates, n=n, cutoff=0.6)
+    return [stop for match in matches for stop in names[match]][:n]